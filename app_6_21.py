@@ -1,21 +1,69 @@
 import requests
-from urllib.parse import quote
-from bs4 import BeautifulSoup
+from urllib.parse import quote, urlsplit
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
 import streamlit as st
-import re
+import json
 import time
 import os
+import threading
+import contextvars
+import heapq
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from columnar_output import columnar_available, write_columnar
+from bizno_parser import extract_best_result_links, extract_table_data, parse_in_pool, read_until_table
+from naver_parser import extract_places
+from response_archive import NAVER_PLACES_RESPONSE, BIZNO_SEARCH_RESPONSE, BIZNO_ARTICLE_RESPONSE, archive_response, flush_archive
+from records import NO_RESULT, STATUS_OK, STATUS_NO_RESULT, STATUS_FAILED, STATUS_DEFERRED, STATUS_RETRY, EXTRACTED_COLUMNS, REFINED_COLUMNS, BUSINESS_COLUMNS, PlaceRecord, BusinessRecord, normalize_phone, base_name, places_to_frame, business_to_frame
+from lookup_cache import NAVER_MISS, BIZNO_MISS, NAVER_PLACES, BIZNO_SEARCH, BIZNO_ARTICLE, ARTICLE_CACHE_TTL, get_cache, get_cached, store_cached, is_known_miss, record_miss, record_fetch, memory_cache_stats
+from phone_ingest import UPLOAD_TYPES, INGEST_CHUNK_SIZE, base_file_name, peek_columns, iter_phone_numbers
+from incremental import DEFAULT_MAX_AGE_DAYS, read_previous_output, split_by_age, merge_incremental, change_report
+from metrics import METRICS
+from batch_coordinator import read_shard_file
+from download_artifacts import ArtifactStore, dataset_version
+from result_viewer import show_paginated
+from tracing import traced, span, stage_span, annotate, mark
+from request_planner import plan_lookups
+from cache_refresher import CacheRefresher
+from job_runner import JobStore, JobRunner, submit_job, job_progress, finished_chunk_dirs, result_paths
+from upstream import ACCEPT_ENCODING, MAX_CONCURRENCY, MAX_RETRIES, PRIORITY_INTERACTIVE, PRIORITY_BATCH, CircuitOpenError, http_get, get_breaker, get_retry_budget, backoff_delay, concurrency_limits, request_priority
+
+# Upstream base URLs; point these at local stand-ins for testing
+NAVER_BASE_URL = os.environ.get('NAVER_BASE_URL', 'https://map.naver.com')
+BIZNO_BASE_URL = os.environ.get('BIZNO_BASE_URL', 'https://bizno.net')
+NAVER_HOST = urlsplit(NAVER_BASE_URL).netloc
+BIZNO_HOST = urlsplit(BIZNO_BASE_URL).netloc
+
+# Bytes read per step while streaming an article page
+ARTICLE_CHUNK_SIZE = 8 * 1024
+
+# How many times numbers deferred by an open circuit are requeued before they are written as failures
+MAX_DEFERRED_ROUNDS = 20
+
+# Shortest wait before a deferred item is tried again, so items do not spin while a half-open probe is out
+MIN_DEFERRED_WAIT = 1.0
+
+# Seconds between status refreshes of a running background job
+JOB_POLL_SECONDS = 3
+
+# Renew popular cache entries in the background before they expire; CACHE_REFRESH=0 turns it off
+CACHE_REFRESH = os.environ.get('CACHE_REFRESH', '1') == '1'
+
+# Output formats offered next to the CSV downloads: label -> (format, extension, mime)
+COLUMNAR_FORMATS = {
+    'Parquet': ('parquet', 'parquet', 'application/vnd.apache.parquet'),
+    'Arrow IPC': ('arrow', 'arrows', 'application/vnd.apache.arrow.stream'),
+}
 
 # Function to fetch page
 def fetch_page(query):
-    base_url = "https://bizno.net/?area=&query="
+    base_url = f"{BIZNO_BASE_URL}/?area=&query="
     encoded_query = quote(query)
     full_url = base_url + encoded_query
 
     headers = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-        'Accept-Encoding': 'gzip, deflate, br, zstd',
+        'Accept-Encoding': ACCEPT_ENCODING,
         'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7',
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36',
         'Upgrade-Insecure-Requests': '1',
@@ -26,58 +74,28 @@ def fetch_page(query):
         'Sec-Fetch-User': '?1'
     }
 
-    response = requests.get(full_url, headers=headers)
+    try:
+        response = http_get(full_url, headers=headers)
+    except requests.RequestException as e:
+        print(f"페이지 요청 실패: {e}")
+        return None
 
     if response.status_code == 200:
         print("페이지 요청 성공")
-        return response.text
+        archive_response(BIZNO_SEARCH_RESPONSE, query, response.content)
+        return response.content  # raw bytes; decoding happens in the parse workers
     else:
         print(f"페이지 요청 실패. 상태 코드: {response.status_code}")
         return None
 
-# Function to extract best result links
-def extract_best_result_links(html, target_name, max_results=3):
-    soup = BeautifulSoup(html, 'html.parser')
-    results = soup.find_all('div', class_='titles')
-
-    if not results:
-        return []
-
-    # Clean the target name
-    target_name_clean = target_name.strip().replace(" ", "")
-    extracted_links = []
-
-    for result in results:
-        title_tag = result.find('h4')
-        if title_tag:
-            title = title_tag.get_text(strip=True).replace(" ", "")
-            link_tag = result.find('a', href=True)
-            if title == target_name_clean and link_tag:
-                extracted_links.append((link_tag['href'], title_tag.get_text(strip=True)))
-                if len(extracted_links) >= max_results:
-                    return extracted_links
-
-    # If exact match not found, check for '(주)' prefix
-    for result in results:
-        title_tag = result.find('h4')
-        if title_tag:
-            title = title_tag.get_text(strip=True).replace(" ", "")
-            link_tag = result.find('a', href=True)
-            if title == f"(주){target_name_clean}" and link_tag:
-                extracted_links.append((link_tag['href'], title_tag.get_text(strip=True)))
-                if len(extracted_links) >= max_results:
-                    return extracted_links
-
-    return extracted_links
-
-# Function to fetch article
-def fetch_article(link):
-    base_url = "https://bizno.net"
-    full_url = base_url + link
+# Function to send the article request; extra headers carry validators for conditional requests
+def request_article(link, extra_headers=None, stream=False):
+    base_url = BIZNO_BASE_URL
+    full_url = requests.utils.requote_uri(base_url + link)  # links may carry unescaped Korean
 
     headers = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-        'Accept-Encoding': 'gzip, deflate, br, zstd',
+        'Accept-Encoding': ACCEPT_ENCODING,
         'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7',
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36',
         'Upgrade-Insecure-Requests': '1',
@@ -87,45 +105,122 @@ def fetch_article(link):
         'Sec-Fetch-Site': 'none',
         'Sec-Fetch-User': '?1'
     }
+    if extra_headers:
+        headers.update(extra_headers)
 
-    response = requests.get(full_url, headers=headers)
-
-    if response.status_code == 200:
-        print("기사 페이지 요청 성공")
-        return response.text
-    else:
-        print(f"기사 페이지 요청 실패. 상태 코드: {response.status_code}")
+    try:
+        return http_get(full_url, headers=headers, stream=stream)
+    except requests.RequestException as e:
+        print(f"기사 페이지 요청 실패: {e}")
         return None
 
-# Function to extract table data
-def extract_table_data(html):
-    soup = BeautifulSoup(html, 'html.parser')
-    table = soup.find('table', class_='table_guide01')
-    
-    if not table:
-        print("테이블을 찾을 수 없습니다.")
+# Function to get the parsed table of an article, reusing the cached parse while fresh and
+# revalidating it with ETag/Last-Modified once it expires, so a 304 skips both the body and the parse;
+# revalidate=True revalidates a fresh entry too, for the cache refresher
+def fetch_article_data(link, revalidate=False):
+    entry = get_cache().get_stale(BIZNO_ARTICLE, link, count_hit=not revalidate)
+    if entry is not None and entry['fresh'] and not revalidate:
+        annotate(cache='hit')
+        return entry['value']['data']
+    annotate(cache='stale' if entry is not None else 'miss')
+
+    validators = {}
+    if entry is not None:
+        if entry['value'].get('etag'):
+            validators['If-None-Match'] = entry['value']['etag']
+        if entry['value'].get('last_modified'):
+            validators['If-Modified-Since'] = entry['value']['last_modified']
+
+    response = request_article(link, validators, stream=True)
+    if response is None:
         return None
 
-    data = {}
-    for row in table.find_all('tr'):
-        cols = row.find_all(['th', 'td'])
-        if len(cols) == 2:
-            header = cols[0].text.strip()
-            value = cols[1].text.strip()
-            data[header] = value
-
-    columns = ["회사명(영문)", "업태", "종목", "주요제품", "전화번호", "팩스번호", "기업규모", "법인구분", "본사/지사", "법인형태", "설립일", "홈페이지", "대표자명", "사업자등록번호", "법인등록번호", "회사주소"]
-    extracted_data = {col: data.get(col, '') for col in columns}
-    
+    try:
+        if response.status_code == 304 and entry is not None:
+            print("기사 페이지 변경 없음 (304)")
+            annotate(status=304)
+            get_cache().set(BIZNO_ARTICLE, link, entry['value'], ARTICLE_CACHE_TTL)
+            return entry['value']['data']
+        if response.status_code != 200:
+            print(f"기사 페이지 요청 실패. 상태 코드: {response.status_code}")
+            return None
+
+        print("기사 페이지 요청 성공")
+        annotate(status=200)
+        # Stop reading once the company table has closed; the rest of the page is never used
+        chunks = response.iter_content(chunk_size=ARTICLE_CHUNK_SIZE)
+        article_html, complete = read_until_table(chunks)
+        with span('article_parse'):
+            extracted_data = parse_in_pool(extract_table_data, article_html)
+        if extracted_data is None and complete:
+            # The prefix did not parse into the company table, so read and parse the whole page after all
+            article_html += b''.join(chunks)
+            complete = False
+            with span('article_parse', full_body=True):
+                extracted_data = parse_in_pool(extract_table_data, article_html)
+    except requests.RequestException as e:
+        print(f"기사 페이지 수신 실패: {e}")
+        return None
+    finally:
+        # Closing a partly read response drops the connection instead of draining the rest of the body;
+        # it also gives back the host's limiter slot, which a streamed response holds until then
+        response.close()
+    METRICS.incr('article_bytes_read', len(article_html), host=BIZNO_HOST)
+    if complete:
+        METRICS.incr('article_early_close', host=BIZNO_HOST)
+
+    annotate(bytes=len(article_html), early_close=complete)
+    archive_response(BIZNO_ARTICLE_RESPONSE, link, article_html)
+    if not complete or extracted_data is None:
+        # A table that never closed or never parsed may come from a cut-off body; keeping it for a week behind
+        # validators would let a 304 confirm the bad parse, so the next lookup fetches the page again instead
+        print("기사 페이지의 테이블이 완전하지 않아 캐시에 저장하지 않습니다.")
+        METRICS.incr('article_uncached', host=BIZNO_HOST)
+        return extracted_data
+    get_cache().set(BIZNO_ARTICLE, link, {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'data': extracted_data,
+    }, ARTICLE_CACHE_TTL)
     return extracted_data
 
-# Function to fetch and process data by phone number with retry mechanism
-def fetch_and_process_data(phone_number, max_retries=5, initial_delay=2):
-    url = f"https://map.naver.com/p/api/search/allSearch?query={phone_number}&type=all&searchCoord=126.85150490000274%3B37.553927499999716&boundary="
+# Function to fetch and process data by phone number; one attempt, traced as one naver_fetch span per attempt
+def fetch_and_process_data(phone_number):
+    with traced(phone_number):
+        with span('normalize', phone=phone_number) as normalize_args:
+            normalize_args['normalized'] = normalize_phone(phone_number)
+        with span('naver_fetch', phone=phone_number, normalized=normalize_args['normalized']):
+            records = request_places(phone_number)
+            annotate(status=records[0].status, places=len(records))
+            return records
+
+# Function to get the cache key of a number: its digits, so '02-123-4567' and '021234567' share entries
+def phone_cache_key(phone_number):
+    return normalize_phone(phone_number) or phone_number
+
+# Function to get the place list of one number from the caches or Naver; transient failures come back as STATUS_RETRY
+def request_places(phone_number):
+    key = phone_cache_key(phone_number)
+    # Numbers Naver recently answered with an empty place list are not asked again until the negative TTL runs out
+    if is_known_miss(NAVER_MISS, key):
+        annotate(cache='negative_hit')
+        return [PlaceRecord.no_result(phone_number)]
+
+    # Place lists found by any session (or an earlier run) are reused until the positive TTL runs out
+    cached = get_cached(NAVER_PLACES, key)
+    if cached is not None:
+        annotate(cache='hit')
+        return [PlaceRecord(phone_number, *place) for place in cached]
+    annotate(cache='miss')
+    return download_places(phone_number)
+
+# Function to ask Naver for the place list of one number and cache the answer
+def download_places(phone_number):
+    url = f"{NAVER_BASE_URL}/p/api/search/allSearch?query={phone_number}&type=all&searchCoord=126.85150490000274%3B37.553927499999716&boundary="
 
     headers = {
         'Accept': 'application/json, text/plain, */*',
-        'Accept-Encoding': 'gzip, deflate, br, zstd',
+        'Accept-Encoding': ACCEPT_ENCODING,
         'Accept-Language': 'ko-KR,ko;q=0.8,en-US;q=0.6,en;q=0.4',
         'Cache-Control': 'no-cache',
         'Cookie': 'NNB=NPJOP2RQ4OAGK; NAC=AiscBMAJe939B; NACT=1; MM_PF=SEARCH; page_uid=iFaK2lqo1iCssmU/5+ossssst9V-397270; BUC=htSJvvHt8R3cQ7t_28Ox4DHSvcweJp-3iPnVEMLw0rQ=',
@@ -140,148 +235,523 @@ def fetch_and_process_data(phone_number, max_retries=5, initial_delay=2):
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36'
     }
 
-    delay = initial_delay
-    for attempt in range(max_retries):
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            try:
-                data = response.json()
-            except json.JSONDecodeError:
-                st.error(f"JSON 디코딩에 실패했습니다: {response.text}")
-                return [{
-                    'searchedPhoneNumber': phone_number,
-                    'name': '검색결과없음',
-                    'tel': '검색결과없음',
-                    'category': '검색결과없음',
-                    'roadAddress': '검색결과없음'
-                }]
-
-            place_data = data.get('result', {}).get('place')
-            
-            if not place_data or not place_data.get('list'):
-                return [{
-                    'searchedPhoneNumber': phone_number,
-                    'name': '검색결과없음',
-                    'tel': '검색결과없음',
-                    'category': '검색결과없음',
-                    'roadAddress': '검색결과없음'
-                }]
-
-            place_list = place_data.get('list', [])
-
-            extracted_data = []
-            for place in place_list:
-                name = place.get('name', '')
-                tel = place.get('tel', '')
-                category = ', '.join(place.get('category', []))
-                road_address = place.get('roadAddress', '')
-                extracted_data.append({
-                    'searchedPhoneNumber': phone_number,
-                    'name': name,
-                    'tel': tel,
-                    'category': category,
-                    'roadAddress': road_address
-                })
-
-            return extracted_data
-        else:
-            print(f"요청 실패. 상태 코드: {response.status_code}. {attempt + 1}/{max_retries} 시도 후 {delay}초 대기 중...")
-            time.sleep(delay)
-            delay *= 2  # Exponential backoff
-
-    st.error(f"{max_retries}번의 시도 후에도 요청이 실패했습니다.")
-    return [{
-        'searchedPhoneNumber': phone_number,
-        'name': '검색결과없음',
-        'tel': '검색결과없음',
-        'category': '검색결과없음',
-        'roadAddress': '검색결과없음'
-    }]
-
-# Function to clean name
-def clean_name(name):
-    name = re.sub(r'\d+', '', name)
-    name = re.sub(r'\(.*?\)', '', name)
-    name = name.strip()
-    return name
+    try:
+        response = http_get(url, headers=headers)
+    except CircuitOpenError:
+        # Naver is refusing requests; hand the number back to be requeued instead of sleeping here
+        return [PlaceRecord.no_result(phone_number, STATUS_DEFERRED)]
+    except requests.RequestException as e:
+        # The retry queue in run_lookups decides when (and whether) to try again; this worker moves on
+        print(f"요청 실패: {e}. 재시도 대기열에 넣습니다.")
+        return [PlaceRecord.no_result(phone_number, STATUS_RETRY)]
+
+    if response.status_code != 200:
+        print(f"요청 실패. 상태 코드: {response.status_code}. 재시도 대기열에 넣습니다.")
+        return [PlaceRecord.no_result(phone_number, STATUS_RETRY)]
+
+    # Archived before parsing, so responses a parser bug choked on can be re-parsed later
+    archive_response(NAVER_PLACES_RESPONSE, phone_number, response.content)
+    try:
+        places = extract_places(response.content)
+    except json.JSONDecodeError:
+        st.error(f"JSON 디코딩에 실패했습니다: {response.text}")
+        return [PlaceRecord.no_result(phone_number, STATUS_FAILED)]
+
+    record_fetch(normalize_phone(phone_number))
+
+    if not places:
+        # A genuine miss; decode errors and exhausted retries are not cached
+        record_miss(NAVER_MISS, phone_cache_key(phone_number))
+        return [PlaceRecord.no_result(phone_number)]
+
+    store_cached(NAVER_PLACES, phone_cache_key(phone_number), places)
+    return [PlaceRecord(phone_number, *place) for place in places]
+
+# Function to search bizno for a name and cache the matching article links; None if the search failed
+def search_links(business_name):
+    result = fetch_page(business_name)
+    best_links = parse_in_pool(extract_best_result_links, result, business_name, max_results=3) if result else None
+    if best_links:
+        store_cached(BIZNO_SEARCH, business_name, best_links)
+    return best_links
+
+# Function to look up business registration rows for one refined name; None means deferred by an open circuit
+def lookup_business(phone_number, business_name):
+    with traced(phone_number), span('bizno_lookup', name=business_name) as trace_args:
+        if business_name == NO_RESULT:
+            return [BusinessRecord.no_result(phone_number)]
+        if is_known_miss(BIZNO_MISS, business_name):
+            trace_args['cache'] = 'negative_hit'
+            return [BusinessRecord.no_result(phone_number)]
+
+        business_data = []
+        try:
+            with span('bizno_search') as search_args:
+                best_links = get_cached(BIZNO_SEARCH, business_name)
+                search_args['cache'] = 'hit' if best_links is not None else 'miss'
+                if best_links is None:
+                    best_links = search_links(business_name)
+                search_args['links'] = len(best_links or [])
+            if best_links is not None:
+                for link, h4_text in best_links:
+                    with span('article', link=link):
+                        extracted_data = fetch_article_data(link)
+                    if extracted_data:
+                        business_data.append(BusinessRecord.from_table(extracted_data, phone_number, business_name, h4_text))
+                if not best_links:
+                    record_miss(BIZNO_MISS, business_name)
+                    business_data.append(BusinessRecord.no_result(phone_number))
+        except CircuitOpenError:
+            trace_args['status'] = STATUS_DEFERRED
+            return None
+        trace_args['rows'] = len(business_data)
+        return business_data
+
+# Function to pick the most common cleaned base name per phone number
+def refine_places(df):
+    with stage_span('refine', rows=len(df)):
+        base_names = df['name'].apply(base_name)
+        grouped = base_names.groupby(df['searchedPhoneNumber']).agg(lambda x: x.value_counts().idxmax()).reset_index()
+        grouped.columns = ['searchedPhoneNumber', 'name']
+    return grouped
+
+# Function to write a dataset in a columnar format and offer it for download; the file is rewritten
+# only when the dataset changed, and read back only when the button is clicked
+def offer_columnar_download(df, version, output_format, output_dir, file_name, suffix, columns, label):
+    file_format, extension, mime = COLUMNAR_FORMATS[output_format]
+    path = os.path.join(output_dir, f'{file_name}_{suffix}.{extension}')
+    with stage_span('write_output', path=path):
+        get_artifact_store().write_once(path, version, lambda: write_columnar(df, path, columns, file_format=file_format))
+
+    def read_file():
+        with open(path, 'rb') as f:
+            return f.read()
+
+    st.download_button(label=f"{label} {output_format} 다운로드", data=read_file, file_name=os.path.basename(path), mime=mime, on_click='ignore')
+
+# Function to create a worker pool whose threads can still write to the Streamlit page; outside a script run
+# (job runner, batch workers, lookup service) there is no page, so the threads get no context
+def make_worker_pool(max_workers=MAX_CONCURRENCY):
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return ThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx))
+
+# Function to run lookups on the worker pool. Items deferred by an open circuit are requeued once it allows
+# probes again, and transient failures wait in a delayed retry queue with jittered backoff while the workers
+# carry on with other items; retries stop at MAX_RETRIES or when the host's retry budget runs out. items may be
+# a stream: it is read only while fewer than window items are unsettled, and progress gets the settled count
+def run_lookups(lookup, items, host, is_deferred, report=st.warning, is_retryable=lambda outcome: False,
+                max_deferred_rounds=MAX_DEFERRED_ROUNDS, window=INGEST_CHUNK_SIZE, progress=None):
+    source = iter(items)
+    items = []
+    results = []
+    still_deferred = []
+    retries = []
+    deferrals = []
+    settled = 0
+    exhausted = False
+    delayed = []  # heap of (due time, item index)
+    budget = get_retry_budget(host)
+    deferral_reported = False
+    # Workers run in the caller's context so request priority (and anything else set there) follows each lookup
+    parent = contextvars.copy_context()
+    with make_worker_pool() as pool:
+        running = {}
+        while True:
+            # Top up from the input as items settle; a slow or deferred item only holds its own place in the window
+            while not exhausted and len(items) - settled < window:
+                item = next(source, None)
+                if item is None:
+                    exhausted = True
+                    break
+                items.append(item)
+                results.append(None)
+                retries.append(0)
+                deferrals.append(0)
+                running[pool.submit(parent.copy().run, lookup, *item)] = len(items) - 1
+            if not running and not delayed:
+                break
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now:
+                _, i = heapq.heappop(delayed)
+                running[pool.submit(parent.copy().run, lookup, *items[i])] = i
+            METRICS.set_gauge('retry_queue_depth', len(delayed), host=host)
+            timeout = delayed[0][0] - now if delayed else None
+            if not running:
+                time.sleep(timeout)
+                continue
+
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                outcome = future.result()
+                if is_deferred(outcome) and deferrals[i] < max_deferred_rounds:
+                    deferrals[i] += 1
+                    wait_time = max(MIN_DEFERRED_WAIT, get_breaker(host).retry_after())
+                    if not deferral_reported:
+                        report(f"{host} 요청이 차단되어 보류된 항목을 {wait_time:.0f}초 후 다시 시도합니다.")
+                        deferral_reported = True
+                    heapq.heappush(delayed, (time.monotonic() + wait_time, i))
+                    with traced(items[i][0]):
+                        mark('deferred', wait=round(wait_time, 2))
+                elif is_retryable(outcome) and retries[i] < MAX_RETRIES and budget.withdraw():
+                    retries[i] += 1
+                    METRICS.incr('retries_scheduled', host=host)
+                    delay = backoff_delay(retries[i])
+                    heapq.heappush(delayed, (time.monotonic() + delay, i))
+                    with traced(items[i][0]):
+                        mark('retry_scheduled', attempt=retries[i], delay=round(delay, 2))
+                else:
+                    if is_deferred(outcome):
+                        still_deferred.append(items[i])
+                    else:
+                        deferral_reported = False
+                        results[i] = outcome
+                    settled += 1
+                    if progress and settled % window == 0:
+                        progress(settled)
+
+    METRICS.set_gauge('retry_queue_depth', 0, host=host)
+    return results, still_deferred
+
+# Function to look up the places of a list or stream of numbers, with failed retries and still deferred numbers settled
+def lookup_places(phone_numbers, report=st.warning, max_deferred_rounds=MAX_DEFERRED_ROUNDS, progress=None):
+    read_numbers = []
+
+    def read_items():
+        for phone_number in phone_numbers:
+            read_numbers.append(phone_number)
+            yield (phone_number,)
+
+    results, still_deferred = run_lookups(fetch_and_process_data, read_items(), NAVER_HOST,
+                                          lambda records: records[0].status == STATUS_DEFERRED, report,
+                                          lambda records: records[0].status == STATUS_RETRY, max_deferred_rounds,
+                                          progress=progress)
+    if still_deferred and max_deferred_rounds:
+        report(f"네이버 요청 차단이 계속되어 {len(still_deferred)}건을 검색결과없음으로 저장합니다.")
+    failed = 0
+    settled = []
+    for phone_number, records in zip(read_numbers, results):
+        if records is None:
+            records = [PlaceRecord.no_result(phone_number, STATUS_DEFERRED if not max_deferred_rounds else STATUS_FAILED)]
+        elif records[0].status == STATUS_RETRY:
+            failed += 1
+            records = [PlaceRecord.no_result(phone_number, STATUS_FAILED)]
+        settled.append(records)
+    if failed:
+        report(f"{failed}건은 재시도 후에도 요청이 실패했습니다.")
+    return settled
+
+# Function to run the Naver stage for phone numbers and return the place records in input order;
+# numbers may come from a stream, which is read as earlier lookups settle rather than chunk by chunk
+def collect_places(phone_numbers, report=st.warning, progress=None):
+    # Requests run concurrently; the per-host limiter in upstream.py decides how many are in flight
+    settled = lookup_places(phone_numbers, report, progress=progress)
+    if progress:
+        progress(len(settled))
+    return [record for records in settled for record in records]
+
+# Function to run the bizno stage for the refined dataset and return the business records
+def collect_businesses(grouped, report=st.warning):
+    refined_rows = list(zip(grouped['searchedPhoneNumber'], grouped['name']))
+    for phone_number, name in refined_rows:
+        with traced(phone_number):
+            mark('refined', name=name)
+    results, still_deferred = run_lookups(lookup_business, refined_rows, BIZNO_HOST, lambda records: records is None, report)
+    if still_deferred:
+        report(f"bizno 요청 차단이 계속되어 {len(still_deferred)}건을 검색결과없음으로 저장합니다.")
+    business_data = []
+    for (phone_number, _), records in zip(refined_rows, results):
+        business_data.extend(records if records is not None else [BusinessRecord.no_result(phone_number)])
+    return business_data
+
+# Function to run the whole pipeline without the UI, returning the extracted, refined and business datasets
+def run_pipeline(phone_numbers, report=print):
+    df = places_to_frame(collect_places(phone_numbers, report))
+    grouped = refine_places(df)
+    business_df = business_to_frame(collect_businesses(grouped, report))
+    # A finished run's responses go to the archive now, not when a member fills or the process exits
+    flush_archive()
+    return df, grouped, business_df
+
+# Function to refresh only new or stale numbers and merge them with a previous run's outputs
+def run_incremental(phone_numbers, previous_extracted, previous_business, max_age_days, previous_run_at, report=st.warning):
+    reuse, fetch = split_by_age(phone_numbers, previous_extracted, max_age_days, previous_run_at)
+    fresh_extracted = places_to_frame(collect_places(fetch, report))
+    fresh_business = business_to_frame(collect_businesses(refine_places(fresh_extracted), report))
+    flush_archive()
+
+    df, business_df = merge_incremental(phone_numbers, reuse, previous_extracted, previous_business, fresh_extracted, fresh_business)
+    grouped = refine_places(df)
+    report_df = change_report(phone_numbers, fetch, previous_extracted, previous_business, business_df)
+    return df, grouped, business_df, report_df, len(fetch)
+
+# Function to get the download payloads shared by every session, built on first click
+@st.cache_resource
+def get_artifact_store():
+    return ArtifactStore()
+
+# Function to offer a lazily serialized CSV download; the CSV is built on the first click for this version of
+# the data, and clicking does not rerun the page
+def offer_csv_download(df, version, label, file_name):
+    st.download_button(label=label, data=lambda: get_artifact_store().csv(df, version), file_name=file_name, mime='text/csv', on_click='ignore')
+
+# Function to show a dataset with its CSV download and optional columnar download
+def offer_dataset(df, version, title, csv_label, output_format, output_dir, file_name, suffix, columns, columnar_label):
+    if title:
+        st.write(title)
+    show_paginated(df, suffix)
+    offer_csv_download(df, version, csv_label, f'{file_name}_{suffix}.csv')
+    if output_format != '없음':
+        offer_columnar_download(df, version, output_format, output_dir, file_name, suffix, columns, columnar_label)
+
+# Function to compute one stage of a run once per input: reruns of the page (paging, other widgets) reuse the
+# session's result instead of repeating the lookups and hashing the frames for their versions again
+def run_stage(run_key, stage, compute):
+    run = st.session_state.get('run')
+    if run is None or run['key'] != run_key:
+        run = st.session_state['run'] = {'key': run_key}
+    if stage not in run:
+        run[stage] = compute()
+    return run[stage]
+
+# Function to pair a dataset with its version, computed once when the dataset is built
+def versioned(df):
+    return df, dataset_version(df)
+
+# Function to offer every dataset of a run as one compressed archive, built on first click
+def offer_bundle(datasets, file_name):
+    members = [(f'{file_name}_{suffix}.csv', df, version) for suffix, df, version in datasets]
+    st.download_button(label="전체 결과 ZIP 다운로드", data=lambda: get_artifact_store().zip_bundle(members),
+                       file_name=f'{file_name}_results.zip', mime='application/zip', on_click='ignore')
+
+# Function to open the job table and start the background runner once per server process;
+# both outlive the sessions, so jobs keep running when a tab is closed or the websocket drops
+@st.cache_resource
+def get_job_store():
+    store = JobStore()
+    JobRunner(store).start()
+    return store
+
+# Function to show the chunks a running job has finished so far; refreshes itself until the job is over
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_running_job(job_id):
+    store = get_job_store()
+    job = job_progress(store, job_id)
+    if job['status'] in ('done', 'failed'):
+        st.rerun()  # redraw the whole page once, with the downloads
+
+    total_chunks = sum(job['chunks'].values())
+    done_chunks = job['chunks'].get('done', 0)
+    st.progress(done_chunks / total_chunks if total_chunks else 1.0, text=f"{done_chunks}/{total_chunks} 청크 완료 ({job['total']}건)")
+    chunk_dirs = finished_chunk_dirs(store, job_id)
+    if chunk_dirs:
+        st.write("완료된 청크의 정제된 데이터")
+        show_paginated(pd.concat([read_shard_file(d, 'refined') for d in chunk_dirs], ignore_index=True), f'{job_id}_refined')
+
+# Function to offer a finished job's result file; it is read on the first click and then shared like the other
+# downloads, since a finished job's files never change
+def offer_job_download(path, label, file_name, key):
+    def read_file():
+        with open(path, 'rb') as f:
+            return f.read()
+
+    st.download_button(label=label, data=lambda: get_artifact_store().get_or_build('job_file', path, read_file),
+                       file_name=file_name, mime='text/csv', key=key, on_click='ignore')
+
+# Function to show a background job's status and, once it has finished, its downloads
+def show_job(job_id):
+    job = job_progress(get_job_store(), job_id)
+    if job is None:
+        st.error(f"작업을 찾을 수 없습니다: {job_id}")
+        return
+
+    st.caption(f"작업 {job_id} · {job['file_name']} · 상태: {job['status']}")
+    if job['status'] == 'failed':
+        st.error(f"작업이 실패했습니다: {job['error']}")
+    elif job['status'] == 'done':
+        labels = {'extracted_data': "CSV 파일 다운로드", 'refined_data': "정제된 CSV 파일 다운로드", 'business_data': "사업자 등록 정보 CSV 다운로드"}
+        for suffix, path in result_paths(job_id).items():
+            offer_job_download(path, labels[suffix], f"{job['file_name']}_{suffix}.csv", f'{job_id}_{suffix}')
+    else:
+        show_running_job(job_id)
+
+# Function to start the cache refresher once per server process; with CACHE_REFRESH off it only purges expired entries.
+# The fetch functions report failures in their results instead of raising, so each refresher checks the result
+@st.cache_resource
+def get_cache_refresher():
+    refresher = CacheRefresher({
+        NAVER_PLACES: lambda phone_number: download_places(phone_number)[0].status in (STATUS_OK, STATUS_NO_RESULT),
+        BIZNO_SEARCH: lambda business_name: search_links(business_name) is not None,
+        BIZNO_ARTICLE: lambda link: fetch_article_data(link, revalidate=True) is not None,
+    } if CACHE_REFRESH else {})
+    refresher.start()
+    return refresher
+
+# Function to show the shared lookup cache's statistics in the sidebar
+def show_cache_panel():
+    with st.sidebar.expander("조회 캐시 상태"):
+        stats = memory_cache_stats()
+        st.metric("메모리 사용량", f"{stats['bytes'] / 1024 / 1024:.1f} / {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+        st.metric("항목 수", stats['entries'])
+        st.metric("적중률", f"{stats['hit_rate']:.1%}", help=f"적중 {stats['hits']}회 / 미적중 {stats['misses']}회")
+        st.caption(f"용량 초과로 제거 {stats['evictions']}건 · 만료로 제거 {stats['expirations']}건")
+        if CACHE_REFRESH:
+            refreshed, failed = (sum(METRICS.counter(name, namespace=ns) for ns in (NAVER_PLACES, BIZNO_SEARCH, BIZNO_ARTICLE))
+                                 for name in ('cache_refreshes', 'cache_refresh_errors'))
+            st.caption(f"만료 전 미리 갱신 {refreshed}건 · 갱신 실패 {failed}건")
+
+# Function to show a dry-run plan: what the run would send upstream and roughly how long it would take
+def show_plan(plan):
+    st.write("드라이런 결과 (요청을 보내지 않았습니다)")
+    st.caption(f"입력 {plan['input']}건 · 고유 번호 {plan['unique']}건 · 중복 {plan['duplicates']}건 · 잘못된 번호 {plan['invalid']}건")
+    naver_col, bizno_col, time_col = st.columns(3)
+    naver_col.metric("예상 Naver 요청", plan['naver']['requests'],
+                     help=f"캐시 {plan['naver']['cached']}건 · 최근 결과없음 {plan['naver']['known_miss']}건")
+    bizno_col.metric("예상 bizno 요청", plan['bizno']['requests'],
+                     help=f"검색 {plan['bizno']['search_requests']}건 · 기사 {plan['bizno']['article_requests']}건 · "
+                          f"재검증 {plan['bizno']['article_revalidations']}건 · 캐시된 기사 {plan['bizno']['article_cached']}건")
+    time_col.metric("예상 소요 시간", f"{plan['estimated_seconds'] / 60:.1f}분",
+                    help=f"재시도 포함 최대 {plan['estimated_seconds_with_retries'] / 60:.1f}분, 현재 동시 요청 한도 기준")
 
 # Main function
 def main():
     st.title("전화번호 검색 결과")
+    get_cache_refresher()
+    show_cache_panel()
 
     input_method = st.radio("입력 방식을 선택하세요", ('직접 입력', '파일 업로드'))
 
     phone_numbers = []
     file_name = ""
-    
+    run_key = None  # identifies the input, so reruns with the same input reuse the run's results
+    incremental = False
+    background = False
+    dry_run = False
+
+    # One-off lookups are served ahead of uploads; each upload is its own job in the fair-share rotation
+    priority, job_id = PRIORITY_INTERACTIVE, 'interactive'
     if input_method == '직접 입력':
         phone_number = st.text_input("검색할 전화번호를 입력하세요")
         if phone_number:
             phone_numbers.append(phone_number)
+            run_key = ('direct', phone_number)
         file_name = st.text_input("저장할 파일명을 입력하세요")
 
     elif input_method == '파일 업로드':
-        uploaded_file = st.file_uploader("전화번호 리스트가 있는 파일을 업로드하세요", type="txt")
+        # Dry run: count what an upload would cost from the caches, without sending a single request
+        dry_run = st.checkbox("드라이런: 요청 없이 예상 요청 수와 소요 시간만 계산")
+        uploaded_file = st.file_uploader("전화번호 리스트가 있는 파일을 업로드하세요 (txt, csv, xlsx, gz/zip 압축 가능)", type=UPLOAD_TYPES)
         if uploaded_file is not None:
-            phone_numbers = uploaded_file.read().decode('utf-8').splitlines()
-            file_name = os.path.splitext(uploaded_file.name)[0]  # Extract the file name without extension
-
-    if phone_numbers and file_name:
-        all_extracted_data = []
-        for phone_number in phone_numbers:
-            extracted_data = fetch_and_process_data(phone_number)
-            all_extracted_data.extend(extracted_data)
-
-        if all_extracted_data:
-            df = pd.DataFrame(all_extracted_data)
-            st.dataframe(df)
-
-            csv = df.to_csv(index=False, encoding='utf-8-sig')
-            st.download_button(label="CSV 파일 다운로드", data=csv, file_name=f'{file_name}_extracted_data.csv', mime='text/csv')
-
-            df['clean_name'] = df['name'].apply(clean_name)
-            df['base_name'] = df['clean_name'].apply(lambda x: x.split()[0] if x else x)
-            grouped = df.groupby('searchedPhoneNumber')['base_name'].agg(lambda x: x.value_counts().idxmax()).reset_index()
-            grouped.columns = ['searchedPhoneNumber', 'name']
-
-            st.write("정제된 데이터셋")
-            st.dataframe(grouped)
-            refined_csv = grouped.to_csv(index=False, encoding='utf-8-sig')
-            st.download_button(label="정제된 CSV 파일 다운로드", data=refined_csv, file_name=f'{file_name}_refined_data.csv', mime='text/csv')
+            columns = peek_columns(uploaded_file, uploaded_file.name)
+            column = st.selectbox("전화번호가 들어 있는 열을 선택하세요", columns) if columns else None
+            # Numbers are decoded lazily while the lookups run, instead of decoding the whole file up front
+            phone_numbers = iter_phone_numbers(uploaded_file, uploaded_file.name, column)
+            file_name = base_file_name(uploaded_file.name)  # Extract the file name without extensions
+            ctx = get_script_run_ctx()
+            priority, job_id = PRIORITY_BATCH, f"{ctx.session_id if ctx else ''}:{file_name}"
+            run_key = ('upload', uploaded_file.file_id, column)
+
+        # Background jobs keep running on the server when this tab is closed; results are fetched later by job ID
+        background = not dry_run and st.checkbox("백그라운드 작업으로 실행 (탭을 닫아도 계속 진행)")
+
+        # Incremental mode: reuse a previous run's rows for numbers that are still fresh
+        incremental = not background and not dry_run and st.checkbox("이전 결과와 비교하여 새 번호와 오래된 번호만 조회")
+        if incremental:
+            previous_extracted_file = st.file_uploader("이전 _extracted_data.csv 파일", type="csv")
+            previous_business_file = st.file_uploader("이전 _business_data.csv 파일", type="csv")
+            # No default date: today would make every previous row look fresh
+            previous_run_date = st.date_input("이전 결과 생성일", value=None)
+            max_age_days = st.number_input("이 일수보다 오래된 번호는 다시 조회", min_value=0, value=DEFAULT_MAX_AGE_DAYS)
+            if previous_extracted_file is None or previous_business_file is None:
+                st.info("이전 결과 파일 두 개를 모두 업로드하세요.")
+                phone_numbers = []
+            elif previous_run_date is None:
+                st.info("이전 결과 파일이 만들어진 날짜를 선택하세요.")
+                phone_numbers = []
+            elif run_key is not None:
+                run_key += ('incremental', previous_extracted_file.file_id, previous_business_file.file_id, previous_run_date, max_age_days)
+
+    output_format = st.selectbox("추가 저장 형식 (CSV와 함께 저장)", ['없음'] + list(COLUMNAR_FORMATS))
+    output_dir = "output"
+    if output_format != '없음':
+        output_dir = st.text_input("저장할 폴더를 입력하세요", value="output")
+        if not columnar_available():
+            st.warning("pyarrow가 설치되어 있지 않아 CSV만 저장합니다.")
+            output_format = '없음'
+
+    if dry_run:
+        # Planning reads the cache for every number, so it runs on request and is kept for this upload across reruns
+        if run_key is not None and st.button("예상 요청 수 계산"):
+            st.session_state['plan'] = (run_key, plan_lookups(phone_numbers, NAVER_HOST, BIZNO_HOST))
+        planned_key, plan = st.session_state.get('plan', (None, None))
+        if run_key is not None and planned_key == run_key:
+            show_plan(plan)
+
+    elif background:
+        if phone_numbers and file_name and st.button("작업 등록"):
+            st.session_state['job_id'] = submit_job(get_job_store(), phone_numbers, file_name)
+        job_id = st.text_input("작업 ID로 결과 조회", value=st.session_state.get('job_id', '')).strip()
+        if job_id:
+            show_job(job_id)
+
+    elif phone_numbers and file_name and incremental:
+        def refresh():
+            previous_extracted = read_previous_output(previous_extracted_file)
+            previous_business = read_previous_output(previous_business_file)
+            previous_run_at = time.mktime(previous_run_date.timetuple()) + 24 * 60 * 60  # end of that day
+            numbers = list(phone_numbers)  # the diff needs the whole list more than once
+            with request_priority(priority, job_id):
+                *frames, fetched = run_incremental(numbers, previous_extracted, previous_business, max_age_days, previous_run_at)
+            return [versioned(frame) for frame in frames], len(numbers), fetched
+
+        ((df, extracted_version), (grouped, refined_version), (business_df, business_version), (report_df, report_version)), total, fetched = run_stage(run_key, 'incremental', refresh)
+        st.success(f"전체 {total}건 중 {fetched}건만 새로 조회했습니다.")
+
+        st.write("변경 보고서")
+        st.write(report_df['change'].value_counts())
+        show_paginated(report_df, 'change_report')
+        offer_csv_download(report_df, report_version, "변경 보고서 CSV 다운로드", f'{file_name}_change_report.csv')
+
+        offer_dataset(df, extracted_version, "병합된 추출 데이터셋", "CSV 파일 다운로드", output_format, output_dir, file_name, 'extracted_data', EXTRACTED_COLUMNS, "추출 데이터")
+        offer_dataset(grouped, refined_version, "정제된 데이터셋", "정제된 CSV 파일 다운로드", output_format, output_dir, file_name, 'refined_data', REFINED_COLUMNS, "정제된 데이터")
+        offer_dataset(business_df, business_version, "사업자 등록 정보 데이터셋", "사업자 등록 정보 CSV 다운로드", output_format, output_dir, file_name, 'business_data', BUSINESS_COLUMNS, "사업자 등록 정보")
+        offer_bundle([('extracted_data', df, extracted_version), ('refined_data', grouped, refined_version),
+                      ('business_data', business_df, business_version), ('change_report', report_df, report_version)], file_name)
+
+    elif phone_numbers and file_name:
+        progress_text = st.empty()
+
+        def extract():
+            with request_priority(priority, job_id):
+                return versioned(places_to_frame(collect_places(phone_numbers, progress=lambda done: progress_text.caption(f"{done}건 조회 완료"))))
+
+        df, extracted_version = run_stage(run_key, 'extracted', extract)
+        st.caption("현재 동시 요청 한도: " + ", ".join(f"{host}={limit}" for host, limit in concurrency_limits().items()))
+
+        if not df.empty:
+            offer_dataset(df, extracted_version, None, "CSV 파일 다운로드", output_format, output_dir, file_name, 'extracted_data', EXTRACTED_COLUMNS, "추출 데이터")
+            datasets = [('extracted_data', df, extracted_version)]
+
+            grouped, refined_version = run_stage(run_key, 'refined', lambda: versioned(refine_places(df)))
+            offer_dataset(grouped, refined_version, "정제된 데이터셋", "정제된 CSV 파일 다운로드", output_format, output_dir, file_name, 'refined_data', REFINED_COLUMNS, "정제된 데이터")
+            datasets.append(('refined_data', grouped, refined_version))
 
             # Using the refined names to fetch business registration details
-            business_data = []
-            for _, row in grouped.iterrows():
-                business_name = row['name']
-                if business_name == "검색결과없음":
-                    business_data.append({'SearchedPhoneNumber': row['searchedPhoneNumber'], 'name': '검색결과없음', 'h4텍스트': '', '사업자등록번호': '', '회사명(영문)': '', '업태': '', '종목': '', '주요제품': '', '전화번호': '', '팩스번호': '', '기업규모': '', '법인구분': '', '본사/지사': '', '법인형태': '', '설립일': '', '홈페이지': '', '대표자명': '', '법인등록번호': '', '회사주소': ''})
-                else:
-                    result = fetch_page(business_name)
-                    if result:
-                        best_links = extract_best_result_links(result, business_name, max_results=3)
-                        for link, h4_text in best_links:
-                            article_html = fetch_article(link)
-                            if article_html:
-                                extracted_data = extract_table_data(article_html)
-                                if extracted_data:
-                                    extracted_data['SearchedPhoneNumber'] = row['searchedPhoneNumber']
-                                    extracted_data['name'] = business_name
-                                    extracted_data['h4텍스트'] = h4_text
-                                    business_data.append(extracted_data)
-                        if not best_links:
-                            business_data.append({'SearchedPhoneNumber': row['searchedPhoneNumber'], 'name': '검색결과없음', 'h4텍스트': '', '사업자등록번호': '', '회사명(영문)': '', '업태': '', '종목': '', '주요제품': '', '전화번호': '', '팩스번호': '', '기업규모': '', '법인구분': '', '본사/지사': '', '법인형태': '', '설립일': '', '홈페이지': '', '대표자명': '', '법인등록번호': '', '회사주소': ''})
-
-            if business_data:
-                business_df = pd.DataFrame(business_data)
-                columns = ['SearchedPhoneNumber', 'name', 'h4텍스트', '사업자등록번호'] + [col for col in business_df.columns if col not in ['SearchedPhoneNumber', 'name', 'h4텍스트', '사업자등록번호']]
-                business_df = business_df[columns]
-
-                st.write("사업자 등록 정보 데이터셋")
-                st.dataframe(business_df)
-                business_csv = business_df.to_csv(index=False, encoding='utf-8-sig')
-                st.download_button(label="사업자 등록 정보 CSV 다운로드", data=business_csv, file_name=f'{file_name}_business_data.csv', mime='text/csv')
+            def businesses():
+                with request_priority(priority, job_id):
+                    business_data = collect_businesses(grouped)
+                flush_archive()
+                return versioned(business_to_frame(business_data))
+
+            business_df, business_version = run_stage(run_key, 'business', businesses)
+            if not business_df.empty:
+                offer_dataset(business_df, business_version, "사업자 등록 정보 데이터셋", "사업자 등록 정보 CSV 다운로드", output_format, output_dir, file_name, 'business_data', BUSINESS_COLUMNS, "사업자 등록 정보")
+                datasets.append(('business_data', business_df, business_version))
             else:
                 st.info("사업자 등록 정보가 없습니다.")
+            offer_bundle(datasets, file_name)
         else:
             st.info("추출된 데이터가 없습니다.")
 
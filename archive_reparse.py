@@ -0,0 +1,99 @@
+import argparse
+import os
+from collections import Counter
+
+from app_6_21 import refine_places
+from batch_coordinator import read_phone_list
+from bizno_parser import extract_best_result_links, extract_table_data, get_parse_pool
+from naver_parser import extract_places_or_none
+from records import NO_RESULT, STATUS_FAILED, BusinessRecord, PlaceRecord, business_to_frame, places_to_frame
+from response_archive import BIZNO_ARTICLE_RESPONSE, BIZNO_SEARCH_RESPONSE, NAVER_PLACES_RESPONSE, latest_responses
+
+# Bodies sent to a parse worker at a time; small bodies are not worth a round trip each
+PARSE_CHUNK_SIZE = 64
+
+
+# Function to run a parser over many bodies on the parse pool, in order
+def parse_all(parser, *iterables):
+    pool = get_parse_pool()
+    if pool is None:
+        return list(map(parser, *iterables))
+    return list(pool.map(parser, *iterables, chunksize=PARSE_CHUNK_SIZE))
+
+
+# Function to rebuild the extracted, refined and business datasets from archived responses, without a single
+# request. Each stage reads only the responses the previous one asks for, and the latest response per key wins;
+# phone_numbers defaults to every number in the archive. Returns the datasets and counts of missing responses
+def rebuild_from_archive(paths, phone_numbers=None):
+    missing = Counter()
+
+    naver_bodies = latest_responses(paths, NAVER_PLACES_RESPONSE, None if phone_numbers is None else set(phone_numbers))
+    phone_numbers = list(naver_bodies) if phone_numbers is None else list(phone_numbers)
+    answered = [phone_number for phone_number in phone_numbers if phone_number in naver_bodies]
+    parsed = dict(zip(answered, parse_all(extract_places_or_none, [naver_bodies[p] for p in answered])))
+    place_records = []
+    for phone_number in phone_numbers:
+        if phone_number not in parsed:
+            missing['naver'] += 1
+            place_records.append(PlaceRecord.no_result(phone_number, STATUS_FAILED))
+        elif parsed[phone_number] is None:
+            missing['naver_invalid'] += 1
+            place_records.append(PlaceRecord.no_result(phone_number, STATUS_FAILED))
+        elif parsed[phone_number]:
+            place_records.extend(PlaceRecord(phone_number, *place) for place in parsed[phone_number])
+        else:
+            place_records.append(PlaceRecord.no_result(phone_number))
+    df = places_to_frame(place_records)
+    grouped = refine_places(df)
+
+    refined_rows = list(zip(grouped['searchedPhoneNumber'], grouped['name']))
+    search_bodies = latest_responses(paths, BIZNO_SEARCH_RESPONSE, {name for _, name in refined_rows if name != NO_RESULT})
+    searched = list(search_bodies)
+    links_by_name = dict(zip(searched, parse_all(extract_best_result_links, [search_bodies[n] for n in searched], searched)))
+
+    article_bodies = latest_responses(paths, BIZNO_ARTICLE_RESPONSE, {link for links in links_by_name.values() for link, _ in links})
+    article_links = list(article_bodies)
+    tables = dict(zip(article_links, parse_all(extract_table_data, [article_bodies[link] for link in article_links])))
+
+    # Same rows lookup_business would produce: nothing for a search that never succeeded, no_result for no match
+    business_data = []
+    for phone_number, name in refined_rows:
+        if name == NO_RESULT:
+            business_data.append(BusinessRecord.no_result(phone_number))
+            continue
+        if name not in links_by_name:
+            missing['bizno_search'] += 1
+            continue
+        if not links_by_name[name]:
+            business_data.append(BusinessRecord.no_result(phone_number))
+            continue
+        for link, h4_text in links_by_name[name]:
+            if link not in tables:
+                missing['bizno_article'] += 1
+            elif tables[link]:
+                business_data.append(BusinessRecord.from_table(tables[link], phone_number, name, h4_text))
+    return df, grouped, business_to_frame(business_data), missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="저장된 원본 응답 아카이브에서 요청 없이 세 데이터셋을 다시 만듭니다.")
+    parser.add_argument('archives', nargs='+', help="RESPONSE_ARCHIVE로 저장한 .gz 아카이브 파일")
+    parser.add_argument('--input', help="다시 만들 전화번호 리스트 (기본값: 아카이브의 모든 번호)")
+    parser.add_argument('--column', help="CSV/XLSX 입력에서 전화번호 열 이름")
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--file-name', default='reparsed')
+    args = parser.parse_args()
+
+    phone_numbers = read_phone_list(args.input, args.column) if args.input else None
+    extracted, grouped, business, missing = rebuild_from_archive(args.archives, phone_numbers)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for suffix, frame in (('extracted_data', extracted), ('refined_data', grouped), ('business_data', business)):
+        frame.to_csv(os.path.join(args.output_dir, f'{args.file_name}_{suffix}.csv'), index=False, encoding='utf-8-sig')
+    print(f"재구성 완료: {len(extracted)}행 / {len(grouped)}행 / {len(business)}행")
+    if missing:
+        # Responses served from the lookup cache during the archived runs were never downloaded, so are not archived
+        print("아카이브에 없는 응답: " + ", ".join(f"{kind} {count}건" for kind, count in missing.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from phone_ingest import base_file_name, iter_phone_numbers
+from records import BUSINESS_COLUMNS, EXTRACTED_COLUMNS
+from tracing import stage_span
+
+SHARD_SIZE = 1000
+
+# A claimed shard is handed to another worker if its lease is not renewed in time
+LEASE_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+
+SHARD_FILES = {
+    'extracted': 'extracted_data.csv',
+    'refined': 'refined_data.csv',
+    'business': 'business_data.csv',
+}
+
+
+# Shard queue kept in a SQLite file; every worker process, on this machine or a shared disk, opens the same file
+class ShardCoordinator:
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS shards ('
+            'batch TEXT NOT NULL, shard INTEGER NOT NULL, phones TEXT NOT NULL, '
+            "status TEXT NOT NULL DEFAULT 'pending', worker TEXT, lease_expires REAL, "
+            'attempts INTEGER NOT NULL DEFAULT 0, error TEXT, output_dir TEXT NOT NULL, '
+            'PRIMARY KEY (batch, shard))'
+        )
+
+    def create_batch(self, batch, phone_numbers, output_dir, shard_size=SHARD_SIZE):
+        rows = []
+        for shard, start in enumerate(range(0, len(phone_numbers), shard_size)):
+            shard_dir = os.path.join(output_dir, batch, f'shard_{shard:05d}')
+            rows.append((batch, shard, json.dumps(phone_numbers[start:start + shard_size], ensure_ascii=False), shard_dir))
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute('DELETE FROM shards WHERE batch = ?', (batch,))
+            self._conn.executemany('INSERT INTO shards (batch, shard, phones, output_dir) VALUES (?, ?, ?, ?)', rows)
+            self._conn.execute('COMMIT')
+        return len(rows)
+
+    def claim(self, worker, batch=None, lease=LEASE_SECONDS):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # A lease that ran out means the worker died mid-shard (a crash or OOM kill never reaches fail());
+                # those shards count the attempt like fail() does, so a shard that kills its worker stops coming back
+                self._conn.execute(
+                    "UPDATE shards SET status = 'failed', lease_expires = NULL, error = ? "
+                    "WHERE status = 'running' AND lease_expires < ? AND attempts >= ? AND (? IS NULL OR batch = ?)",
+                    (f"작업자가 응답하지 않아 {MAX_ATTEMPTS}회 시도 후 실패했습니다.", now, MAX_ATTEMPTS, batch, batch),
+                )
+                row = self._conn.execute(
+                    "SELECT batch, shard, phones, output_dir FROM shards "
+                    "WHERE (status = 'pending' OR (status = 'running' AND lease_expires < ? AND attempts < ?)) "
+                    "AND (? IS NULL OR batch = ?) ORDER BY batch, shard LIMIT 1",
+                    (now, MAX_ATTEMPTS, batch, batch),
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE shards SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                        "WHERE batch = ? AND shard = ?",
+                        (worker, now + lease, row[0], row[1]),
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        if not row:
+            return None
+        return {'batch': row[0], 'shard': row[1], 'phones': json.loads(row[2]), 'output_dir': row[3]}
+
+    def renew(self, batch, shard, worker, lease=LEASE_SECONDS):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE shards SET lease_expires = ? WHERE batch = ? AND shard = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease, batch, shard, worker),
+            )
+
+    def complete(self, batch, shard, worker):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE shards SET status = 'done', lease_expires = NULL, error = NULL WHERE batch = ? AND shard = ? AND worker = ?",
+                (batch, shard, worker),
+            )
+
+    def fail(self, batch, shard, worker, error):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_expires = NULL, error = ? WHERE batch = ? AND shard = ? AND worker = ?",
+                (MAX_ATTEMPTS, error, batch, shard, worker),
+            )
+
+    def status(self, batch):
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM shards WHERE batch = ? GROUP BY status', (batch,)).fetchall()
+        return dict(rows)
+
+    def shards(self, batch):
+        with self._lock:
+            rows = self._conn.execute('SELECT shard, status, output_dir FROM shards WHERE batch = ? ORDER BY shard', (batch,)).fetchall()
+        return [{'shard': r[0], 'status': r[1], 'output_dir': r[2]} for r in rows]
+
+
+# Function to read phone numbers from a txt/csv/xlsx list, optionally compressed, as main() does for uploads
+def read_phone_list(path, column=None):
+    with open(path, 'rb') as f:
+        return list(iter_phone_numbers(f, path, column))
+
+
+# Function to run the full pipeline for one list of numbers and write its three datasets to a directory
+def process_shard(phone_numbers, output_dir, report=print):
+    from app_6_21 import run_pipeline
+
+    df, grouped, business_df = run_pipeline(phone_numbers, report)
+    os.makedirs(output_dir, exist_ok=True)
+    with stage_span('write_output', dir=output_dir):
+        for kind, frame in (('extracted', df), ('refined', grouped), ('business', business_df)):
+            # Write to a temporary name first so a crashed worker never leaves a half-written shard behind
+            path = os.path.join(output_dir, SHARD_FILES[kind])
+            frame.to_csv(path + '.tmp', index=False, encoding='utf-8')
+            os.replace(path + '.tmp', path)
+
+
+# Function to read one dataset of a finished shard
+def read_shard_file(output_dir, kind):
+    return pd.read_csv(os.path.join(output_dir, SHARD_FILES[kind]), dtype=str, keep_default_na=False)
+
+
+# Function to merge per-shard outputs into the same three datasets main() produces
+def merge_shard_outputs(shard_dirs):
+    from app_6_21 import refine_places
+
+    extracted = pd.concat([read_shard_file(d, 'extracted') for d in shard_dirs], ignore_index=True) if shard_dirs else pd.DataFrame(columns=EXTRACTED_COLUMNS)
+    # Refining is cheap and local, so redo it over the merged rows; numbers split across shards then count once
+    grouped = refine_places(extracted)
+
+    business_parts = []
+    for order, shard_dir in enumerate(shard_dirs):
+        part = read_shard_file(shard_dir, 'business')
+        part['_shard'] = order
+        business_parts.append(part)
+    if business_parts:
+        business = pd.concat(business_parts, ignore_index=True)
+        # A number repeated in several shards keeps the rows of the first shard that looked it up
+        first_shard = business.groupby('SearchedPhoneNumber')['_shard'].transform('min')
+        business = business[business['_shard'] == first_shard].drop(columns='_shard')
+        business = business.sort_values('SearchedPhoneNumber', kind='stable').reset_index(drop=True)
+    else:
+        business = pd.DataFrame(columns=BUSINESS_COLUMNS)
+    return extracted, grouped, business[BUSINESS_COLUMNS]
+
+
+# Function to process one claimed shard while a heartbeat keeps its lease; returns True when it completed
+def process_claimed(coordinator, worker_id, claimed, lease=LEASE_SECONDS):
+    from upstream import PRIORITY_BATCH, request_priority
+
+    print(f"[{worker_id}] 샤드 {claimed['batch']}/{claimed['shard']} 처리 시작 ({len(claimed['phones'])}건)")
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(lease / 3):
+            coordinator.renew(claimed['batch'], claimed['shard'], worker_id, lease)
+
+    renewer = threading.Thread(target=heartbeat, daemon=True)
+    renewer.start()
+    try:
+        # Each batch is its own job in the upstream fair-share rotation
+        with request_priority(PRIORITY_BATCH, claimed['batch']):
+            process_shard(claimed['phones'], claimed['output_dir'])
+    except Exception as e:
+        coordinator.fail(claimed['batch'], claimed['shard'], worker_id, repr(e))
+        print(f"[{worker_id}] 샤드 {claimed['batch']}/{claimed['shard']} 실패: {e!r}")
+        return False
+    else:
+        coordinator.complete(claimed['batch'], claimed['shard'], worker_id)
+        return True
+    finally:
+        stop.set()
+        renewer.join()
+
+
+# Function to claim and process shards until none are left
+def run_worker(coordinator, worker_id, batch=None, lease=LEASE_SECONDS):
+    processed = 0
+    while True:
+        claimed = coordinator.claim(worker_id, batch, lease)
+        if claimed is None:
+            return processed
+        if process_claimed(coordinator, worker_id, claimed, lease):
+            processed += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="전화번호 리스트를 샤드로 나누어 여러 워커로 처리합니다.")
+    parser.add_argument('--db', default='batch_coordinator.sqlite3', help="코디네이터 SQLite 파일 (여러 서버에서는 공유 디스크 경로)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    init_parser = subparsers.add_parser('init', help="전화번호 리스트를 샤드로 등록")
+    init_parser.add_argument('input')
+    init_parser.add_argument('--batch', help="배치 이름 (기본값: 입력 파일명)")
+    init_parser.add_argument('--column', help="CSV/XLSX 입력에서 전화번호 열 이름")
+    init_parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    init_parser.add_argument('--output-dir', default='shards')
+
+    work_parser = subparsers.add_parser('work', help="샤드를 가져와 처리하는 워커 실행")
+    work_parser.add_argument('--batch')
+    work_parser.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}')
+    work_parser.add_argument('--lease', type=float, default=LEASE_SECONDS)
+
+    status_parser = subparsers.add_parser('status', help="배치 진행 상황 출력")
+    status_parser.add_argument('batch')
+
+    merge_parser = subparsers.add_parser('merge', help="완료된 샤드 결과를 하나의 데이터셋으로 병합")
+    merge_parser.add_argument('batch')
+    merge_parser.add_argument('--output-dir', default='.')
+
+    args = parser.parse_args()
+    coordinator = ShardCoordinator(args.db)
+
+    if args.command == 'init':
+        batch = args.batch or base_file_name(args.input)
+        phone_numbers = read_phone_list(args.input, args.column)
+        count = coordinator.create_batch(batch, phone_numbers, args.output_dir, args.shard_size)
+        print(f"배치 '{batch}': {len(phone_numbers)}건을 {count}개 샤드로 등록했습니다.")
+    elif args.command == 'work':
+        processed = run_worker(coordinator, args.worker_id, args.batch, args.lease)
+        print(f"[{args.worker_id}] 처리할 샤드가 없습니다. 완료한 샤드: {processed}개")
+    elif args.command == 'status':
+        print(json.dumps(coordinator.status(args.batch), ensure_ascii=False))
+    elif args.command == 'merge':
+        shards = coordinator.shards(args.batch)
+        unfinished = [s['shard'] for s in shards if s['status'] != 'done']
+        if unfinished:
+            print(f"아직 완료되지 않은 샤드가 있습니다: {unfinished}")
+            sys.exit(1)
+        extracted, grouped, business = merge_shard_outputs([s['output_dir'] for s in shards])
+        os.makedirs(args.output_dir, exist_ok=True)
+        for suffix, frame in (('extracted_data', extracted), ('refined_data', grouped), ('business_data', business)):
+            frame.to_csv(os.path.join(args.output_dir, f'{args.batch}_{suffix}.csv'), index=False, encoding='utf-8-sig')
+        print(f"배치 '{args.batch}' 병합 완료: {len(extracted)}행 / {len(grouped)}행 / {len(business)}행")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import atexit
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from bs4 import BeautifulSoup
+
+from records import TABLE_COLUMNS
+
+# Parsing runs in worker processes so it is not serialized behind the GIL; 0 parses in the calling thread
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', os.cpu_count() or 1))
+
+# Opening tag of the company table in an article page (the bare class name may also appear in CSS or scripts),
+# and any table tag, counted so a nested table does not end it; everything after its closing tag is never parsed
+TABLE_START = re.compile(rb'<table\b[^>]*\bclass\s*=\s*["\']?[^"\'>]*\btable_guide01\b[^>]*>', re.IGNORECASE)
+TABLE_TAG = re.compile(rb'<(/?)table\b[^>]*>', re.IGNORECASE)
+
+
+# Function to extract best result links
+def extract_best_result_links(html, target_name, max_results=3):
+    soup = BeautifulSoup(html, 'html.parser')
+    results = soup.find_all('div', class_='titles')
+
+    if not results:
+        return []
+
+    # Clean the target name
+    target_name_clean = target_name.strip().replace(" ", "")
+    extracted_links = []
+
+    for result in results:
+        title_tag = result.find('h4')
+        if title_tag:
+            title = title_tag.get_text(strip=True).replace(" ", "")
+            link_tag = result.find('a', href=True)
+            if title == target_name_clean and link_tag:
+                extracted_links.append((link_tag['href'], title_tag.get_text(strip=True)))
+                if len(extracted_links) >= max_results:
+                    return extracted_links
+
+    # If exact match not found, check for '(주)' prefix
+    for result in results:
+        title_tag = result.find('h4')
+        if title_tag:
+            title = title_tag.get_text(strip=True).replace(" ", "")
+            link_tag = result.find('a', href=True)
+            if title == f"(주){target_name_clean}" and link_tag:
+                extracted_links.append((link_tag['href'], title_tag.get_text(strip=True)))
+                if len(extracted_links) >= max_results:
+                    return extracted_links
+
+    return extracted_links
+
+
+# Function to extract table data
+def extract_table_data(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', class_='table_guide01')
+    
+    if not table:
+        print("테이블을 찾을 수 없습니다.")
+        return None
+
+    data = {}
+    for row in table.find_all('tr'):
+        cols = row.find_all(['th', 'td'])
+        if len(cols) == 2:
+            header = cols[0].text.strip()
+            value = cols[1].text.strip()
+            data[header] = value
+
+    extracted_data = {col: data.get(col, '') for col in TABLE_COLUMNS}
+    
+    return extracted_data
+
+
+# Function to find where scanning resumes: at a tag cut off by the end of the buffer, so a tag split across
+# chunks is matched whole once the next chunk arrives
+def _resume_at(buffer, scanned):
+    last_open = buffer.rfind(b'<', scanned)
+    if last_open >= 0 and buffer.find(b'>', last_open) < 0:
+        return last_open
+    return len(buffer)
+
+
+# Function to read article chunks only until the company table has closed; returns (html, complete)
+# where complete is False when the whole body had to be read because the table never opened or closed
+def read_until_table(chunks):
+    buffer = bytearray()
+    scan_from = 0
+    depth = 0
+    for chunk in chunks:
+        buffer += chunk
+        if not depth:
+            match = TABLE_START.search(buffer, scan_from)
+            if match is None:
+                scan_from = _resume_at(buffer, scan_from)
+                continue
+            scan_from, depth = match.end(), 1
+        for tag in TABLE_TAG.finditer(buffer, scan_from):
+            depth += -1 if tag.group(1) else 1
+            scan_from = tag.end()
+            if not depth:
+                return bytes(buffer[:tag.end()]), True
+        scan_from = _resume_at(buffer, scan_from)
+    return bytes(buffer), False
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+# Function to get the process pool shared by all I/O workers, created on first use
+def get_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None and PARSE_WORKERS > 0:
+            # spawn keeps workers independent of the threads already running in the server process
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_parse_pool.shutdown, wait=False, cancel_futures=True)
+        return _parse_pool
+
+
+# Function to drop a broken pool so the next parse starts a new one
+def _drop_parse_pool(pool):
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Function to run a parser on raw page bytes in the pool; only the small parsed result comes back.
+# A worker that died (OOM kill, crash) breaks the whole pool, so it is replaced and this page is parsed inline
+def parse_in_pool(parser, raw, *args, **kwargs):
+    pool = get_parse_pool()
+    if pool is None:
+        return parser(raw, *args, **kwargs)
+    try:
+        return pool.submit(parser, raw, *args, **kwargs).result()
+    except BrokenProcessPool:
+        print("파싱 프로세스가 종료되어 새 프로세스 풀을 만들고 현재 페이지는 직접 파싱합니다.")
+        _drop_parse_pool(pool)
+        return parser(raw, *args, **kwargs)
@@ -0,0 +1,71 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lookup_cache import get_cache
+from metrics import METRICS
+from upstream import PRIORITY_BACKGROUND, request_priority
+
+# Entries become candidates in the last REFRESH_AHEAD_RATIO of their TTL, so expiries spread out instead of
+# falling off a cliff; entries hit fewer than MIN_REFRESH_HITS times since they were written are left to expire
+REFRESH_AHEAD_RATIO = float(os.environ.get('REFRESH_AHEAD_RATIO', 0.2))
+MIN_REFRESH_HITS = int(os.environ.get('MIN_REFRESH_HITS', 2))
+
+# Entries renewed per scan, seconds between scans, and renewals in flight at once; the limiter's
+# BACKGROUND_SHARE caps how many of them actually reach a host together
+REFRESH_BATCH = 50
+REFRESH_INTERVAL = 60.0
+REFRESH_WORKERS = 4
+
+
+# Background thread that renews popular cache entries shortly before they expire; its requests run at
+# background priority, so they only use upstream slots that interactive and batch lookups leave free.
+# Every scan also purges expired entries, which would otherwise only leave the memory layer when the LRU
+# reached them and never leave the SQLite file
+class CacheRefresher(threading.Thread):
+    # refreshers maps a cache namespace to the function that re-fetches one of its keys and returns whether it
+    # got an answer; with none it only purges
+    def __init__(self, refreshers, interval=REFRESH_INTERVAL, batch=REFRESH_BATCH):
+        super().__init__(name='cache-refresher', daemon=True)
+        self.refreshers = refreshers
+        self.interval = interval
+        self.batch = batch
+        self._stop_event = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='refresh')
+
+    def run(self):
+        while not self._stop_event.is_set():
+            # Nothing restarts this thread, so an error (a locked cache file) only costs one round
+            try:
+                self.run_once()
+                self.purge()
+            except Exception as e:
+                print(f"캐시 관리 오류: {e!r}")
+            # Entries whose renewal failed are still candidates; waiting keeps them from being retried in a loop
+            self._stop_event.wait(self.interval)
+
+    # Renews the most hit entries that are about to expire; returns how many it tried
+    def run_once(self):
+        if not self.refreshers:
+            return 0
+        candidates = get_cache().expiring(list(self.refreshers), REFRESH_AHEAD_RATIO, MIN_REFRESH_HITS, self.batch)
+        for future in [self._pool.submit(self._refresh, namespace, key) for namespace, key, _ in candidates]:
+            future.result()
+        return len(candidates)
+
+    # Drops entries past their expiry (plus the grace of namespaces that are revalidated) from disk and memory
+    def purge(self):
+        METRICS.incr('cache_purged', get_cache().purge_expired())
+
+    def _refresh(self, namespace, key):
+        try:
+            with request_priority(PRIORITY_BACKGROUND, 'refresh'):
+                renewed = self.refreshers[namespace](key)
+        except Exception as e:
+            print(f"캐시 갱신 실패 ({namespace}, {key}): {e}")
+            renewed = False
+        # A failed renewal leaves the entry to expire as it would have anyway
+        METRICS.incr('cache_refreshes' if renewed else 'cache_refresh_errors', namespace=namespace)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,66 @@
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSV downloads keep working without it
+    pa = None
+
+# Rows converted to Arrow per write, so only one batch is materialized at a time
+CHUNK_SIZE = 50000
+
+# Columns with few distinct values are dictionary-encoded
+DICTIONARY_COLUMNS = {'category', '업태', '종목', '기업규모', '법인구분', '본사/지사', '법인형태'}
+
+
+# Function to check whether columnar output can be written
+def columnar_available():
+    return pa is not None
+
+
+# Function to build an Arrow schema for a dataset's columns
+def build_schema(columns):
+    fields = []
+    for col in columns:
+        if col in DICTIONARY_COLUMNS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+# Function to yield Arrow record batches of at most chunk_size rows
+def iter_record_batches(df, schema, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        arrays = []
+        for field in schema:
+            values = chunk[field.name].fillna('').astype(str) if field.name in chunk.columns else [''] * len(chunk)
+            arrays.append(pa.array(values, type=pa.string()).cast(field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# Function to write a dataset as compressed Parquet or Arrow IPC, one chunk at a time
+def write_columnar(df, path, columns, file_format='parquet', compression='zstd', chunk_size=CHUNK_SIZE):
+    if pa is None:
+        raise RuntimeError("pyarrow가 설치되어 있지 않습니다.")
+
+    columns = columns + [col for col in df.columns if col not in columns]
+    schema = build_schema(columns)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    if file_format == 'parquet':
+        with pq.ParquetWriter(path, schema, compression=compression) as writer:
+            for batch in iter_record_batches(df, schema, chunk_size):
+                writer.write_batch(batch)
+    elif file_format == 'arrow':
+        # Stream format, since each batch carries its own dictionary
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_stream(sink, schema, options=options) as writer:
+            for batch in iter_record_batches(df, schema, chunk_size):
+                writer.write_batch(batch)
+    else:
+        raise ValueError(f"지원하지 않는 형식입니다: {file_format}")
+
+    return path
@@ -0,0 +1,64 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import zipfile
+
+import pandas as pd
+
+from lookup_cache import MemoryCache
+
+# Serialized downloads are kept in memory up to this many bytes, and for this long after they were built
+ARTIFACT_CACHE_BYTES = 256 * 1024 * 1024
+ARTIFACT_TTL = 60 * 60
+
+
+# Function to identify the contents of a dataset, so a rerun producing the same rows reuses its downloads
+def dataset_version(df):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+# Download payloads built on first request and then shared by every rerun and session asking for the same version
+class ArtifactStore:
+    def __init__(self, max_bytes=ARTIFACT_CACHE_BYTES, ttl=ARTIFACT_TTL):
+        self.ttl = ttl
+        self._cache = MemoryCache(max_bytes, name='artifacts')
+        self._written = {}  # path -> version last written there
+        self._lock = threading.Lock()
+
+    def get_or_build(self, kind, version, build):
+        held = self._cache.get(kind, version)
+        if held is not None and held[1] > time.time():
+            return held[0]
+        data = build()
+        self._cache.set(kind, version, data, len(data), time.time() + self.ttl)
+        return data
+
+    # CSV with a BOM so Excel opens the Korean text correctly
+    def csv(self, df, version):
+        return self.get_or_build('csv', version, lambda: df.to_csv(index=False).encode('utf-8-sig'))
+
+    # One deflate-compressed archive holding the CSV of every (file name, dataset, version)
+    def zip_bundle(self, members):
+        version = hashlib.blake2b(''.join(f'{name}:{version};' for name, _, version in members).encode('utf-8'), digest_size=16).hexdigest()
+
+        def build():
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for name, df, member_version in members:
+                    archive.writestr(name, self.csv(df, member_version))
+            return buffer.getvalue()
+
+        return self.get_or_build('zip', version, build)
+
+    # Runs write() for a file only when the path does not already hold this version
+    def write_once(self, path, version, write):
+        with self._lock:
+            if self._written.get(path) == version and os.path.exists(path):
+                return
+            write()
+            self._written[path] = version
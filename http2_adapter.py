@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# httpx decodes zstd only from 0.27.1; older versions hand zstd bodies over undecoded, while ACCEPT_ENCODING
+# offers zstd whenever zstandard is installed
+MIN_HTTPX_VERSION = (0, 27, 1)
+
+try:
+    import h2  # noqa: F401  httpx only speaks HTTP/2 when h2 is installed
+    import httpx
+except ImportError:  # httpx[http2] is optional; requests keeps using pooled HTTP/1.1 without it
+    httpx = None
+else:
+    if tuple(int(part) for part in httpx.__version__.split('.')[:3] if part.isdigit()) < MIN_HTTPX_VERSION:
+        httpx = None
+
+# Connections per client, across all hosts. HTTP/2 hosts need only a few, but a host that negotiates HTTP/1.1
+# needs one per request in flight, so build_session sizes this from the limiter's per-host maximum
+MAX_CONNECTIONS = 8
+
+# Seconds a request may wait for a free connection of the client's own pool; separate from the connect
+# timeout, since the wait says nothing about the upstream
+POOL_TIMEOUT = 30.0
+
+# Connection-level headers are not allowed in HTTP/2 requests
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade'}
+
+
+# Raised when a request gave up waiting for a connection of the local pool; it never reached the upstream,
+# so it must not count against the host's limiter or circuit breaker
+class PoolTimeout(requests.exceptions.RequestException):
+    pass
+
+
+# Function to check whether the HTTP/2 transport can be used
+def http2_available():
+    return httpx is not None
+
+
+# Function to turn an httpx error into the requests exception the fetch functions already handle
+def _as_requests_error(error, request):
+    if isinstance(error, httpx.PoolTimeout):
+        return PoolTimeout(error, request=request)
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(error, request=request)
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(error, request=request)
+    if isinstance(error, httpx.DecodingError):
+        return requests.exceptions.ContentDecodingError(error, request=request)
+    return requests.exceptions.ConnectionError(error, request=request)
+
+
+async def _next_chunk(chunks):
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+# Body of an httpx response, shaped like the urllib3 response requests reads from; chunks come out decoded
+class _StreamedBody:
+    def __init__(self, adapter, response, request):
+        self._adapter = adapter
+        self._response = response
+        self._request = request
+        self.version = 20 if response.http_version == 'HTTP/2' else 11
+
+    def stream(self, amt=None, decode_content=True):
+        chunks = self._response.aiter_bytes(amt)
+        while True:
+            try:
+                chunk = self._adapter.run(_next_chunk(chunks))
+            except (httpx.TransportError, httpx.DecodingError) as e:
+                raise _as_requests_error(e, self._request) from e
+            if chunk is None:
+                return
+            yield chunk
+
+    def read(self, amt=None, decode_content=True):
+        return b''.join(self.stream(amt))
+
+    # Closing an unfinished HTTP/2 response resets only its stream; the connection stays up for the others
+    def close(self):
+        self._adapter.run(self._response.aclose())
+
+    release_conn = close
+
+
+# Transport adapter that sends requests through an httpx client with HTTP/2, so concurrent requests to a host
+# share a few multiplexed connections; hosts without HTTP/2 are answered over HTTP/1.1 by the same client.
+# The client is async and runs on one event loop thread, since httpx's sync HTTP/2 connections are not safe
+# to start streams on from many threads at once; the worker threads block on their own request only
+class HTTP2Adapter(BaseAdapter):
+    def __init__(self, max_connections=MAX_CONNECTIONS, verify=True, pool_timeout=POOL_TIMEOUT):
+        super().__init__()
+        self.pool_timeout = pool_timeout
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name='http2-loop', daemon=True).start()
+        self._client = httpx.AsyncClient(
+            http2=True,
+            verify=verify,
+            follow_redirects=False,  # the requests session follows redirects itself
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    # Runs a coroutine on the event loop thread and waits for its result
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        headers = [(name, value) for name, value in request.headers.items() if name.lower() not in HOP_BY_HOP_HEADERS]
+        try:
+            response = self.run(self._client.send(
+                self._client.build_request(request.method, request.url, headers=headers, content=request.body,
+                                           timeout=httpx.Timeout(read, connect=connect, pool=self.pool_timeout)),
+                stream=True,
+            ))
+        except httpx.TransportError as e:
+            raise _as_requests_error(e, request) from e
+        return self.build_response(request, response)
+
+    def build_response(self, request, response):
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.reason = response.reason_phrase
+        # Repeated headers are joined like urllib3 does
+        headers = CaseInsensitiveDict()
+        for name, value in response.headers.multi_items():
+            headers[name] = f'{headers[name]}, {value}' if name in headers else value
+        result.headers = headers
+        result.encoding = get_encoding_from_headers(headers)
+        result.raw = _StreamedBody(self, response, request)
+        result.url = request.url
+        result.request = request
+        result.connection = self
+        return result
+
+    def close(self):
+        self.run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,93 @@
+import time
+
+import pandas as pd
+
+from lookup_cache import last_fetched
+from records import BUSINESS_COLUMNS, EXTRACTED_COLUMNS, NO_RESULT, normalize_phone
+
+# Numbers looked up longer ago than this are fetched again
+DEFAULT_MAX_AGE_DAYS = 30
+
+REPORT_COLUMNS = ['searchedPhoneNumber', 'change', 'previous_name', 'current_name', 'previous_사업자등록번호', 'current_사업자등록번호']
+
+
+# Function to read a previous _extracted_data.csv or _business_data.csv, keeping phone numbers as text
+def read_previous_output(source):
+    return pd.read_csv(source, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+
+
+# Function to split a new phone list into numbers whose previous rows can be reused and numbers to fetch
+def split_by_age(phone_numbers, previous_extracted, max_age_days, previous_run_at, now=None):
+    now = time.time() if now is None else now
+    max_age = max_age_days * 24 * 60 * 60
+    known = set(previous_extracted['searchedPhoneNumber'].map(normalize_phone))
+
+    reuse, fetch = [], []
+    for phone_number in phone_numbers:
+        key = normalize_phone(phone_number)
+        if key in known:
+            # The previous file cannot be newer than its own run; a later fetch in the cache was not written into it
+            fetched_at = last_fetched(key)
+            fetched_at = previous_run_at if fetched_at is None else min(fetched_at, previous_run_at)
+            if now - fetched_at <= max_age:
+                reuse.append(phone_number)
+                continue
+        fetch.append(phone_number)
+    return reuse, fetch
+
+
+# Function to keep only the rows of a dataset whose phone column belongs to the given numbers
+def rows_for(df, column, phone_numbers):
+    keys = {normalize_phone(phone_number) for phone_number in phone_numbers}
+    return df[df[column].map(normalize_phone).isin(keys)]
+
+
+# Function to merge reused previous rows with freshly fetched rows into extracted and business datasets
+def merge_incremental(phone_numbers, reuse, previous_extracted, previous_business, fresh_extracted, fresh_business):
+    position = {}
+    for i, phone_number in enumerate(phone_numbers):
+        position.setdefault(normalize_phone(phone_number), i)
+
+    extracted = pd.concat([rows_for(previous_extracted, 'searchedPhoneNumber', reuse)[EXTRACTED_COLUMNS], fresh_extracted], ignore_index=True)
+    # Same order as the new list, as if everything had been fetched in one pass
+    order = extracted['searchedPhoneNumber'].map(normalize_phone).map(position)
+    extracted = extracted.iloc[order.argsort(kind='stable')].reset_index(drop=True)
+
+    business = pd.concat([rows_for(previous_business, 'SearchedPhoneNumber', reuse).reindex(columns=BUSINESS_COLUMNS, fill_value=''), fresh_business], ignore_index=True)
+    business = business.sort_values('SearchedPhoneNumber', kind='stable').reset_index(drop=True)
+    return extracted, business
+
+
+# Function to summarize a business dataset per normalized number as (refined name, registration numbers)
+def summarize_businesses(business):
+    summary = {}
+    for phone_number, rows in business.groupby(business['SearchedPhoneNumber'].map(normalize_phone)):
+        numbers = sorted({number for number in rows['사업자등록번호'] if number})
+        summary[phone_number] = (rows['name'].iloc[0], '; '.join(numbers))
+    return summary
+
+
+# Function to list new, changed, disappeared, removed and unchanged numbers between two runs
+def change_report(phone_numbers, fetched, previous_extracted, previous_business, business):
+    previous_keys = set(previous_extracted['searchedPhoneNumber'].map(normalize_phone))
+    current_keys = {normalize_phone(phone_number) for phone_number in phone_numbers}
+    fetched_keys = {normalize_phone(phone_number) for phone_number in fetched}
+    before_all = summarize_businesses(previous_business)
+    after_all = summarize_businesses(business)
+
+    rows = []
+    for key in sorted(previous_keys | current_keys):
+        before = before_all.get(key, (NO_RESULT, ''))
+        after = after_all.get(key, (NO_RESULT, '')) if key in current_keys else ('', '')
+        if key not in current_keys:
+            change = 'removed'  # dropped from the phone list
+        elif key not in previous_keys:
+            change = 'new'
+        elif key not in fetched_keys or before == after:
+            change = 'unchanged'
+        elif before[1] and not after[1]:
+            change = 'disappeared'  # still listed, but no registered business any more
+        else:
+            change = 'changed'
+        rows.append((key, change, before[0], after[0], before[1], after[1]))
+    return pd.DataFrame.from_records(rows, columns=REPORT_COLUMNS)
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from batch_coordinator import ShardCoordinator, merge_shard_outputs, process_claimed
+from phone_ingest import INGEST_CHUNK_SIZE, base_file_name, iter_phone_numbers
+
+JOBS_DB = os.environ.get('JOBS_DB', 'jobs.sqlite3')
+JOBS_DIR = os.environ.get('JOBS_DIR', 'jobs')
+
+# Seconds an idle runner waits before looking for new chunks again
+POLL_INTERVAL = 2.0
+
+# Final datasets of a finished job, named like the downloads in main()
+RESULT_SUFFIXES = ('extracted_data', 'refined_data', 'business_data')
+
+# Seconds after which a job still 'merging' is taken to belong to a runner that died, and is queued again
+MERGE_TIMEOUT = 30 * 60
+
+
+# Durable job table; uploads are split into chunks in the shard coordinator, which lives in the same file
+class JobStore:
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_id TEXT PRIMARY KEY, file_name TEXT NOT NULL, total INTEGER NOT NULL, '
+            "status TEXT NOT NULL DEFAULT 'queued', created_at REAL NOT NULL, finished_at REAL, error TEXT, merging_since REAL)"
+        )
+        # Job tables from before stale merges were recovered
+        if 'merging_since' not in [row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')]:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN merging_since REAL')
+        self.coordinator = ShardCoordinator(path)
+
+    def create(self, job_id, file_name, total):
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (job_id, file_name, total, created_at) VALUES (?, ?, ?, ?)',
+                (job_id, file_name, total, time.time()),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT job_id, file_name, total, status, created_at, finished_at, error FROM jobs WHERE job_id = ?',
+                (job_id,),
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('job_id', 'file_name', 'total', 'status', 'created_at', 'finished_at', 'error'), row))
+
+    def recent(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute('SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+        return [row[0] for row in rows]
+
+    # Moves a job from one status to another; returns False if another runner changed it first
+    def transition(self, job_id, from_status, to_status, error=None):
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = CASE WHEN ? IN (\'done\', \'failed\') THEN ? END, '
+                'merging_since = CASE WHEN ? = \'merging\' THEN ? END WHERE job_id = ? AND status = ?',
+                (to_status, error, to_status, now, to_status, now, job_id, from_status),
+            ).rowcount
+        return updated == 1
+
+    # Queues jobs again whose merge started more than timeout seconds ago, since their runner crashed or was
+    # killed mid-merge; returns how many were requeued
+    def requeue_stale_merges(self, timeout=MERGE_TIMEOUT):
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', merging_since = NULL WHERE status = 'merging' AND merging_since < ?",
+                (time.time() - timeout,),
+            ).rowcount
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [row[0] for row in rows]
+
+
+# Function to register a phone list as a background job and return its ID
+def submit_job(store, phone_numbers, file_name, chunk_size=INGEST_CHUNK_SIZE):
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    phone_numbers = list(phone_numbers)
+    store.coordinator.create_batch(job_id, phone_numbers, JOBS_DIR, chunk_size)
+    store.create(job_id, file_name, len(phone_numbers))
+    return job_id
+
+
+# Function to report a job with its chunk counts, e.g. {'status': 'queued', 'chunks': {'done': 3, 'pending': 7}}
+def job_progress(store, job_id):
+    job = store.get(job_id)
+    if job is None:
+        return None
+    job['chunks'] = store.coordinator.status(job_id)
+    return job
+
+
+# Function to list the output directories of a job's finished chunks, in input order
+def finished_chunk_dirs(store, job_id):
+    return [s['output_dir'] for s in store.coordinator.shards(job_id) if s['status'] == 'done']
+
+
+# Function to get the paths of a finished job's datasets
+def result_paths(job_id):
+    return {suffix: os.path.join(JOBS_DIR, job_id, f'{suffix}.csv') for suffix in RESULT_SUFFIXES}
+
+
+# Function to merge a job's chunks once none are left to run; only one runner gets to do it.
+# A merge error fails the job instead of propagating, so it cannot take the runner down with it
+def finalize_if_complete(store, job_id):
+    counts = store.coordinator.status(job_id)
+    if counts.get('pending') or counts.get('running'):
+        return False
+    if not store.transition(job_id, 'queued', 'merging'):
+        return False
+
+    if counts.get('failed'):
+        store.transition(job_id, 'merging', 'failed', f"{counts['failed']}개 청크가 실패했습니다.")
+        return True
+    try:
+        datasets = merge_shard_outputs(finished_chunk_dirs(store, job_id))
+        os.makedirs(os.path.join(JOBS_DIR, job_id), exist_ok=True)
+        for (suffix, path), frame in zip(result_paths(job_id).items(), datasets):
+            frame.to_csv(path + '.tmp', index=False, encoding='utf-8-sig')
+            os.replace(path + '.tmp', path)
+    except Exception as e:
+        print(f"작업 {job_id} 병합 실패: {e!r}")
+        store.transition(job_id, 'merging', 'failed', repr(e))
+        return True
+    store.transition(job_id, 'merging', 'done')
+    return True
+
+
+# Background thread that runs queued job chunks; it outlives the Streamlit sessions that submitted them
+class JobRunner(threading.Thread):
+    def __init__(self, store, worker_id=None, poll_interval=POLL_INTERVAL):
+        super().__init__(name='job-runner', daemon=True)
+        self.store = store
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-runner'
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            # Nothing restarts this thread, so an error (a locked or broken jobs file) only costs one round
+            try:
+                busy = self.run_once()
+            except Exception as e:
+                print(f"[{self.worker_id}] 작업 실행기 오류: {e!r}")
+                busy = False
+            if not busy:
+                self._stop_event.wait(self.poll_interval)
+
+    # Runs one chunk if any is waiting; returns False when there was nothing to do
+    def run_once(self):
+        requeued = self.store.requeue_stale_merges()
+        if requeued:
+            print(f"[{self.worker_id}] 중단된 병합 {requeued}건을 다시 대기열에 넣었습니다.")
+        claimed = self.store.coordinator.claim(self.worker_id)
+        if claimed is not None:
+            process_claimed(self.store.coordinator, self.worker_id, claimed)
+        # Jobs whose last chunk finished here, or in another runner that stopped before merging
+        for job_id in self.store.unfinished():
+            finalize_if_complete(self.store, job_id)
+        return claimed is not None
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="백그라운드 작업 실행기: 대기 중인 작업을 처리하거나 새 작업을 등록합니다.")
+    parser.add_argument('--db', default=JOBS_DB)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = subparsers.add_parser('submit', help="전화번호 리스트를 작업으로 등록")
+    submit_parser.add_argument('input')
+    submit_parser.add_argument('--column', help="CSV/XLSX 입력에서 전화번호 열 이름")
+
+    subparsers.add_parser('run', help="작업 실행기 실행 (Ctrl+C로 종료)")
+
+    status_parser = subparsers.add_parser('status', help="작업 진행 상황 출력")
+    status_parser.add_argument('job_id')
+
+    args = parser.parse_args()
+    store = JobStore(args.db)
+
+    if args.command == 'submit':
+        with open(args.input, 'rb') as f:
+            job_id = submit_job(store, iter_phone_numbers(f, args.input, args.column), base_file_name(args.input))
+        print(f"작업 등록: {job_id}")
+    elif args.command == 'run':
+        runner = JobRunner(store)
+        try:
+            runner.run()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'status':
+        print(json.dumps(job_progress(store, args.job_id), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from metrics import METRICS
+
+CACHE_PATH = os.environ.get('LOOKUP_CACHE_PATH', 'lookup_cache.sqlite3')
+
+# Genuine "no result" answers are kept for a shorter time than real data, since a business may appear later
+NEGATIVE_CACHE_TTL = float(os.environ.get('NEGATIVE_CACHE_TTL', 24 * 60 * 60))
+
+# Namespaces for negative entries: phone numbers without a Naver place, names without a bizno match
+NAVER_MISS = 'naver_miss'
+BIZNO_MISS = 'bizno_miss'
+
+# Parsed bizno article tables with their ETag/Last-Modified; after the TTL they are revalidated, not dropped
+BIZNO_ARTICLE = 'bizno_article'
+ARTICLE_CACHE_TTL = float(os.environ.get('ARTICLE_CACHE_TTL', 7 * 24 * 60 * 60))
+
+# Seconds expired entries of a namespace are kept on disk for revalidation before purge_expired drops them
+STALE_GRACE = {BIZNO_ARTICLE: ARTICLE_CACHE_TTL}
+
+# Positive answers: Naver place lists per number and bizno search links per refined name
+NAVER_PLACES = 'naver_places'
+BIZNO_SEARCH = 'bizno_search'
+POSITIVE_CACHE_TTL = float(os.environ.get('POSITIVE_CACHE_TTL', 24 * 60 * 60))
+
+# Byte budget of the in-memory layer shared by every session in the process
+MEMORY_CACHE_BYTES = int(os.environ.get('MEMORY_CACHE_BYTES', 64 * 1024 * 1024))
+# Rough per-entry cost of the key, tuple and dict slots on top of the serialized value
+ENTRY_OVERHEAD = 200
+
+# Hits are counted in memory and added to the entries' hit counts on disk every HITS_FLUSH_INTERVAL seconds,
+# at exit, or sooner once HITS_FLUSH_KEYS distinct entries have unsaved hits
+HITS_FLUSH_INTERVAL = 60.0
+HITS_FLUSH_KEYS = 10000
+
+# When each normalized number last got a real answer from Naver, used to judge staleness in incremental runs
+NAVER_FETCHED = 'naver_fetched'
+FETCH_HISTORY_TTL = 365 * 24 * 60 * 60
+
+
+# In-memory LRU of decoded entries with per-entry expiry, bounded by the approximate size of their JSON.
+# Values are shared between callers and must be treated as read-only
+class MemoryCache:
+    def __init__(self, max_bytes=MEMORY_CACHE_BYTES, name='lookup'):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # (namespace, key) -> (value, size, expires_at)
+        self._lock = threading.Lock()
+
+    # Returns (value, expires_at), or None if the entry is not held; an expired entry is dropped on the way
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[2] <= time.time():
+                del self._entries[(namespace, key)]
+                self.bytes -= entry[1]
+                self.expirations += 1
+                self._publish()
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((namespace, key))
+            self.hits += 1
+            return entry[0], entry[2]
+
+    def set(self, namespace, key, value, size, expires_at):
+        size += ENTRY_OVERHEAD
+        with self._lock:
+            old = self._entries.pop((namespace, key), None)
+            if old is not None:
+                self.bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[(namespace, key)] = (value, size, expires_at)
+            self.bytes += size
+            now = time.time()
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size, evicted_expiry) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                if evicted_expiry <= now:
+                    self.expirations += 1
+                else:
+                    self.evictions += 1
+            self._publish()
+
+    def delete(self, namespace, key):
+        with self._lock:
+            old = self._entries.pop((namespace, key), None)
+            if old is not None:
+                self.bytes -= old[1]
+
+    # Drops entries expired for longer than grace seconds, since stale entries may still be revalidated
+    def purge_expired(self, grace=0.0):
+        cutoff = time.time() - grace
+        with self._lock:
+            for entry_key in [k for k, entry in self._entries.items() if entry[2] <= cutoff]:
+                self.bytes -= self._entries.pop(entry_key)[1]
+                self.expirations += 1
+            self._publish()
+
+    def _publish(self):
+        METRICS.set_gauge('memory_cache_bytes', self.bytes, cache=self.name)
+        METRICS.set_gauge('memory_cache_entries', len(self._entries), cache=self.name)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+# SQLite-backed key/value store with per-entry expiry, safe to share between threads and processes;
+# a byte-budgeted memory layer in front of it serves hot entries without touching the disk.
+# Each entry counts its hits since it was last written, so the refresher knows which ones are worth renewing
+class LookupCache:
+    def __init__(self, path=CACHE_PATH, memory_bytes=MEMORY_CACHE_BYTES):
+        self.path = path
+        self.memory = MemoryCache(memory_bytes)
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._hits_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+            'stored_at REAL NOT NULL, expires_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, '
+            'PRIMARY KEY (namespace, key))'
+        )
+        # Purges and refresh scans look entries up by expiry
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)')
+        # Cache files from before hit counting
+        if 'hits' not in [row[1] for row in self._conn.execute('PRAGMA table_info(entries)')]:
+            self._conn.execute('ALTER TABLE entries ADD COLUMN hits INTEGER NOT NULL DEFAULT 0')
+        self._conn.commit()
+
+    # count_hit=False looks without counting, for callers that only inspect the cache
+    def get(self, namespace, key, count_hit=True):
+        entry = self.get_stale(namespace, key, count_hit)
+        if entry is None or not entry['fresh']:
+            return None
+        return entry['value']
+
+    def _count_hit(self, namespace, key):
+        with self._hits_lock:
+            self._hits[(namespace, key)] += 1
+            full = len(self._hits) >= HITS_FLUSH_KEYS
+        if full:
+            self.flush_hits()
+
+    # Adds the hits counted in memory to the entries on disk, where every process's counts meet
+    def flush_hits(self):
+        with self._hits_lock:
+            hits, self._hits = self._hits, Counter()
+        if not hits:
+            return
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE entries SET hits = hits + ? WHERE namespace = ? AND key = ?',
+                [(count, namespace, key) for (namespace, key), count in hits.items()],
+            )
+            self._conn.commit()
+
+    # Lists (namespace, key, hits) of live entries within the last ahead_ratio of their TTL, most hit first
+    def expiring(self, namespaces, ahead_ratio, min_hits=1, limit=100):
+        self.flush_hits()
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT namespace, key, hits FROM entries WHERE namespace IN ({", ".join("?" * len(namespaces))}) '
+                'AND expires_at > ? AND expires_at - ? <= (expires_at - stored_at) * ? AND hits >= ? '
+                'ORDER BY hits DESC LIMIT ?',
+                (*namespaces, now, now, ahead_ratio, min_hits, limit),
+            ).fetchall()
+
+    # Returns {'value': ..., 'fresh': bool} even for expired entries, for callers that can revalidate them
+    def get_stale(self, namespace, key, count_hit=True):
+        held = self.memory.get(namespace, key)
+        if held is not None:
+            fresh = held[1] > time.time()
+            if fresh and count_hit:
+                self._count_hit(namespace, key)
+            return {'value': held[0], 'fresh': fresh}
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?',
+                (namespace, key),
+            ).fetchone()
+        if not row:
+            return None
+        value = json.loads(row[0])
+        fresh = row[1] > time.time()
+        # Expired entries stay on disk only, where revalidation finds them; the memory layer holds live ones
+        if fresh:
+            self.memory.set(namespace, key, value, len(row[0]), row[1])
+        if fresh and count_hit:
+            self._count_hit(namespace, key)
+        return {'value': value, 'fresh': fresh}
+
+    def set(self, namespace, key, value, ttl):
+        now = time.time()
+        text = json.dumps(value, ensure_ascii=False)
+        # Written through, so other processes and later runs still see the entry; rewriting it restarts its hit count
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (namespace, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (namespace, key, text, now, now + ttl),
+            )
+            self._conn.commit()
+        self.memory.set(namespace, key, value, len(text), now + ttl)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM entries WHERE namespace = ? AND key = ?', (namespace, key))
+            self._conn.commit()
+        self.memory.delete(namespace, key)
+
+    # Deletes entries expired for longer than grace seconds, or their namespace's STALE_GRACE if longer,
+    # so namespaces that are revalidated keep their stale entries; returns how many were deleted from disk
+    def purge_expired(self, grace=0.0):
+        now = time.time()
+        kept = {namespace: max(grace, stale) for namespace, stale in STALE_GRACE.items()}
+        with self._lock:
+            deleted = self._conn.execute(
+                f'DELETE FROM entries WHERE expires_at <= ? AND namespace NOT IN ({", ".join("?" * len(kept))})',
+                (now - grace, *kept),
+            ).rowcount
+            for namespace, namespace_grace in kept.items():
+                deleted += self._conn.execute(
+                    'DELETE FROM entries WHERE namespace = ? AND expires_at <= ?', (namespace, now - namespace_grace),
+                ).rowcount
+            self._conn.commit()
+        # Expired entries are of no use in memory, since get_stale reads stale ones from disk
+        self.memory.purge_expired()
+        return deleted
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide cache, opened on first use
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LookupCache()
+            # Shard workers and the lookup service never scan for expiring entries, so their hits are saved
+            # on a timer and at exit instead
+            threading.Thread(target=_flush_hits_periodically, args=(_cache,), name='cache-hits-flush', daemon=True).start()
+            atexit.register(_cache.flush_hits)
+        return _cache
+
+
+# Function to save a cache's counted hits every interval seconds, for the life of the process
+def _flush_hits_periodically(cache, interval=HITS_FLUSH_INTERVAL):
+    while True:
+        time.sleep(interval)
+        try:
+            cache.flush_hits()
+        except sqlite3.Error as e:
+            # The hits are lost, not the thread; later hits are saved on the next round
+            print(f"캐시 적중 횟수 저장 실패: {e}")
+
+
+# Function to check whether a key has a live negative entry
+def is_known_miss(namespace, key):
+    return get_cache().get(namespace, key) is not None
+
+
+# Function to record a genuine miss with the negative TTL
+def record_miss(namespace, key, ttl=None):
+    get_cache().set(namespace, key, True, NEGATIVE_CACHE_TTL if ttl is None else ttl)
+
+
+# Function to remember when a number was last answered by Naver
+def record_fetch(phone_number):
+    get_cache().set(NAVER_FETCHED, phone_number, time.time(), FETCH_HISTORY_TTL)
+
+
+# Function to get the time a number was last answered by Naver, or None
+def last_fetched(phone_number):
+    return get_cache().get(NAVER_FETCHED, phone_number)
+
+
+# Function to get the cached value of a positive answer, or None
+def get_cached(namespace, key):
+    return get_cache().get(namespace, key)
+
+
+# Function to store a positive answer with the positive TTL
+def store_cached(namespace, key, value):
+    get_cache().set(namespace, key, value, POSITIVE_CACHE_TTL)
+
+
+# Function to get the statistics of the shared in-memory layer
+def memory_cache_stats():
+    return get_cache().memory.stats()
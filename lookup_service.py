@@ -0,0 +1,165 @@
+import argparse
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from app_6_21 import lookup_business, lookup_places, normalize_phone, refine_places
+from metrics import METRICS
+from records import BUSINESS_COLUMNS, EXTRACTED_COLUMNS, STATUS_DEFERRED, places_to_frame
+from upstream import MAX_CONCURRENCY, PRIORITY_BATCH, PRIORITY_INTERACTIVE, SingleFlight, request_priority
+
+# Largest number of phone numbers accepted by one bulk request
+MAX_BULK_SIZE = 1000
+
+# Concurrent lookups for the same normalized number or business name share one upstream fetch
+_phone_flight = SingleFlight()
+_business_flight = SingleFlight()
+
+# Function to look up bizno rows for a name, shared by every caller asking for it at the same time
+def lookup_business_shared(business_name):
+    return _business_flight.do(business_name, lambda: lookup_business('', business_name))
+
+
+# Function to convert business records into JSON rows for one phone number
+def business_rows(records, phone_number):
+    rows = []
+    for record in records:
+        row = dict(zip(BUSINESS_COLUMNS, record.as_tuple()))
+        row['SearchedPhoneNumber'] = phone_number
+        rows.append(row)
+    return rows
+
+
+# Function to run the full Naver -> refine -> bizno pipeline for one normalized number
+def lookup_phone(phone_number):
+    # A blocked host answers 503 right away instead of holding the request open until the circuit closes
+    places = lookup_places([phone_number], print, max_deferred_rounds=0)[0]
+    result = {
+        'phone': phone_number,
+        'status': places[0].status,
+        'places': [dict(zip(EXTRACTED_COLUMNS, place.as_tuple())) for place in places],
+        'refined_name': None,
+        'businesses': [],
+    }
+    if places[0].status == STATUS_DEFERRED:
+        return result
+
+    refined_name = refine_places(places_to_frame(places))['name'].iloc[0]
+    result['refined_name'] = refined_name
+    records = lookup_business_shared(refined_name)
+    if records is None:
+        result['status'] = STATUS_DEFERRED
+    else:
+        result['businesses'] = business_rows(records, phone_number)
+    return result
+
+
+# Function to look up one number, coalesced with any in-flight lookup of the same normalized number
+def lookup_phone_shared(phone_number):
+    normalized = normalize_phone(phone_number)
+    if not normalized:
+        raise ValueError(f"전화번호 형식이 올바르지 않습니다: {phone_number!r}")
+    return _phone_flight.do(normalized, lambda: lookup_phone(normalized))
+
+
+# Function to look up many numbers as one batch job, sharing upstream capacity fairly with other bulk requests;
+# each request gets its own bounded workers, so a large request never queues a small one behind its numbers
+def lookup_bulk(phones):
+    job_id = f'bulk-{uuid.uuid4().hex[:8]}'
+
+    def lookup_in_job(phone_number):
+        with request_priority(PRIORITY_BATCH, job_id):
+            return lookup_phone_shared(phone_number)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(phones)))) as pool:
+        return list(pool.map(lookup_in_job, phones))
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    server_version = 'TelephoneSearcher/1.0'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        try:
+            with request_priority(PRIORITY_INTERACTIVE, 'service'):
+                self._handle_get(url, params)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+
+    def _handle_get(self, url, params):
+        if url.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif url.path == '/metrics':
+            self._send_json(200, METRICS.snapshot())
+        elif url.path == '/lookup':
+            result = lookup_phone_shared(params.get('phone', [''])[0])
+            self._send_json(503 if result['status'] == STATUS_DEFERRED else 200, result)
+        elif url.path == '/business':
+            name = params.get('name', [''])[0].strip()
+            if not name:
+                raise ValueError("name 파라미터가 필요합니다.")
+            records = lookup_business_shared(name)
+            if records is None:
+                self._send_json(503, {'name': name, 'status': STATUS_DEFERRED, 'businesses': []})
+            else:
+                self._send_json(200, {'name': name, 'status': 'ok', 'businesses': business_rows(records, '')})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/lookup/bulk':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("요청 본문은 JSON 객체여야 합니다.")
+            phones = body.get('phones', [])
+            if not isinstance(phones, list) or len(phones) > MAX_BULK_SIZE:
+                raise ValueError(f"phones는 최대 {MAX_BULK_SIZE}개의 목록이어야 합니다.")
+            results = lookup_bulk([str(phone) for phone in phones])
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(200, {'results': results})
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+
+# Function to build the lookup server without starting it
+def make_server(host='127.0.0.1', port=8502):
+    return ThreadingHTTPServer((host, port), LookupHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="전화번호 → 사업자 정보 조회 HTTP 서비스")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port)
+    print(f"조회 서비스 시작: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
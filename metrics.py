@@ -0,0 +1,41 @@
+import threading
+
+
+# In-process counters and gauges, keyed by metric name and labels
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    @staticmethod
+    def _key(name, labels):
+        if not labels:
+            return name
+        label_text = ','.join(f'{k}={v}' for k, v in sorted(labels.items()))
+        return f'{name}{{{label_text}}}'
+
+    def incr(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def gauge(self, name, **labels):
+        with self._lock:
+            return self._gauges.get(self._key(name, labels))
+
+    def snapshot(self):
+        with self._lock:
+            return {'counters': dict(self._counters), 'gauges': dict(self._gauges)}
+
+
+METRICS = Metrics()
@@ -0,0 +1,27 @@
+import json
+
+
+# Function to extract (name, tel, category, roadAddress) per place from a raw allSearch response;
+# an empty list is a genuine miss, and invalid JSON raises json.JSONDecodeError
+def extract_places(raw):
+    data = json.loads(raw)
+    place_data = data.get('result', {}).get('place')
+    if not place_data or not place_data.get('list'):
+        return []
+
+    extracted_data = []
+    for place in place_data.get('list', []):
+        name = place.get('name', '')
+        tel = place.get('tel', '')
+        category = ', '.join(place.get('category', []))
+        road_address = place.get('roadAddress', '')
+        extracted_data.append((name, tel, category, road_address))
+    return extracted_data
+
+
+# Function to extract places for offline re-parsing, where one bad body must not stop the batch; None if not JSON
+def extract_places_or_none(raw):
+    try:
+        return extract_places(raw)
+    except json.JSONDecodeError:
+        return None
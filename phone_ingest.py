@@ -0,0 +1,173 @@
+import codecs
+import csv
+import gzip
+import io
+import os
+import re
+import zipfile
+
+try:
+    import openpyxl
+except ImportError:  # openpyxl is only needed for .xlsx uploads
+    openpyxl = None
+
+# Bytes inspected to choose between UTF-8 and CP949 before decoding the rest of the stream; also the read
+# buffer size of the streams, since peek never returns more than one buffer
+SNIFF_BYTES = 64 * 1024
+
+# Numbers handed to the pipeline at a time, so lookups start while the rest of the file is still being read
+INGEST_CHUNK_SIZE = 500
+
+UPLOAD_TYPES = ['txt', 'csv', 'xlsx', 'gz', 'zip']
+
+# Header keywords used to pick the phone column when none is chosen
+PHONE_COLUMN_HINTS = ('전화', '연락처', 'phone', 'tel')
+
+# A first-row cell like this is a number, which means the file has no header row
+PHONE_LIKE = re.compile(r'\+?[\d\s().-]*\d[\d\s().-]*')
+MIN_PHONE_DIGITS = 7
+
+
+# Function to strip compression and archive extensions from an upload name
+def base_file_name(filename):
+    name = os.path.basename(filename)
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
+
+
+# Read-only view of an upload that leaves the upload open when the readers wrapped around it are closed
+class _UploadView(io.RawIOBase):
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def readable(self):
+        return True
+
+    # Fills the buffer as far as the upload allows, so the first peek sees a whole sniff sample
+    def readinto(self, buffer):
+        filled = 0
+        while filled < len(buffer):
+            data = self._fileobj.read(len(buffer) - filled)
+            if not data:
+                break
+            buffer[filled:filled + len(data)] = data
+            filled += len(data)
+        return filled
+
+
+# Function to undo gzip or zip compression; returns the inner binary stream and its file name
+def open_decompressed(fileobj, filename):
+    lower = filename.lower()
+    if lower.endswith('.xlsx'):
+        return fileobj, filename  # openpyxl needs the seekable upload itself
+
+    stream = io.BufferedReader(_UploadView(fileobj), buffer_size=SNIFF_BYTES)
+    magic = stream.peek(4)[:4]
+    if magic[:2] == b'\x1f\x8b':
+        inner_name = filename[:-3] if lower.endswith('.gz') else filename
+        inner = gzip.GzipFile(fileobj=stream)
+    elif magic == b'PK\x03\x04':
+        archive = zipfile.ZipFile(fileobj)
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if not members:
+            raise ValueError("압축 파일 안에 파일이 없습니다.")
+        inner_name = members[0].filename
+        inner = archive.open(members[0])
+    else:
+        return stream, filename
+
+    if file_kind(inner_name) == 'xlsx':
+        # A compressed workbook has to be unpacked into memory, since openpyxl seeks around in it
+        return io.BytesIO(inner.read()), inner_name
+    return io.BufferedReader(_UploadView(inner), buffer_size=SNIFF_BYTES), inner_name
+
+
+# Function to choose an encoding from the first chunk: UTF-8 if it decodes, otherwise CP949
+def detect_encoding(stream):
+    head = stream.peek(SNIFF_BYTES)[:SNIFF_BYTES]
+    try:
+        # final=False tolerates a multi-byte character cut off at the end of the sample
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp949'
+
+
+# Function to open a binary stream as text, decoding it incrementally
+def open_text(stream):
+    return io.TextIOWrapper(stream, encoding=detect_encoding(stream), errors='replace', newline='')
+
+
+# Function to tell which reader a (decompressed) file name needs
+def file_kind(filename):
+    ext = os.path.splitext(filename.lower())[1]
+    if ext == '.xlsx':
+        return 'xlsx'
+    if ext in ('.csv', '.tsv'):
+        return 'csv'
+    return 'txt'
+
+
+# Function to iterate the rows of a CSV or XLSX stream
+def iter_rows(stream, filename):
+    if file_kind(filename) == 'xlsx':
+        if openpyxl is None:
+            raise RuntimeError("XLSX 파일을 읽으려면 openpyxl이 필요합니다.")
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            for row in workbook.active.iter_rows(values_only=True):
+                yield ['' if value is None else str(value) for value in row]
+        finally:
+            workbook.close()
+    else:
+        text = open_text(stream)
+        dialect = csv.excel_tab if filename.lower().endswith('.tsv') else csv.excel
+        yield from csv.reader(text, dialect)
+
+
+# Function to tell whether a cell holds a phone number rather than a column name
+def looks_like_phone(value):
+    value = value.strip()
+    return bool(PHONE_LIKE.fullmatch(value)) and sum(c.isdigit() for c in value) >= MIN_PHONE_DIGITS
+
+
+# Function to pick the phone column from a header row
+def guess_phone_column(header):
+    for i, name in enumerate(header):
+        if any(hint in name.lower() for hint in PHONE_COLUMN_HINTS):
+            return i
+    return 0
+
+
+# Function to read the header of a CSV/XLSX upload; returns None for plain text lists
+def peek_columns(fileobj, filename):
+    stream, inner_name = open_decompressed(fileobj, filename)
+    try:
+        if file_kind(inner_name) == 'txt':
+            return None
+        return next(iter_rows(stream, inner_name), [])
+    finally:
+        if hasattr(fileobj, 'seek'):
+            fileobj.seek(0)
+
+
+# Function to stream phone numbers from a txt/csv/xlsx upload, optionally gzip or zip compressed
+def iter_phone_numbers(fileobj, filename, column=None):
+    stream, inner_name = open_decompressed(fileobj, filename)
+    if file_kind(inner_name) == 'txt':
+        for line in open_text(stream):
+            phone_number = line.strip()
+            if phone_number:
+                yield phone_number
+        return
+
+    rows = iter_rows(stream, inner_name)
+    header = next(rows, [])
+    index = header.index(column) if column in header else guess_phone_column(header)
+    # A list without a header row starts with a number; keep it instead of reading it as column names
+    if index < len(header) and looks_like_phone(header[index]):
+        yield header[index].strip()
+    for row in rows:
+        if index < len(row) and row[index].strip():
+            yield row[index].strip()
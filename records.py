@@ -0,0 +1,110 @@
+import re
+import sys
+
+import pandas as pd
+
+# Sentinel written for numbers and names without a result; interned so every miss shares one string
+NO_RESULT = sys.intern('검색결과없음')
+
+# Lookup outcome carried by each place record (not written to the datasets)
+STATUS_OK = 'ok'
+STATUS_NO_RESULT = 'no_result'
+STATUS_FAILED = 'failed'
+STATUS_DEFERRED = 'deferred'
+STATUS_RETRY = 'retry'  # transient failure, to be tried again from the retry queue
+
+EXTRACTED_COLUMNS = ['searchedPhoneNumber', 'name', 'tel', 'category', 'roadAddress']
+REFINED_COLUMNS = ['searchedPhoneNumber', 'name']
+TABLE_COLUMNS = ["회사명(영문)", "업태", "종목", "주요제품", "전화번호", "팩스번호", "기업규모", "법인구분", "본사/지사", "법인형태", "설립일", "홈페이지", "대표자명", "사업자등록번호", "법인등록번호", "회사주소"]
+BUSINESS_COLUMNS = ['SearchedPhoneNumber', 'name', 'h4텍스트', '사업자등록번호'] + [col for col in TABLE_COLUMNS if col != '사업자등록번호']
+
+# Business fields with a small set of repeated values, interned on the way in
+INTERNED_BUSINESS_COLUMNS = {'업태', '종목', '기업규모', '법인구분', '본사/지사', '법인형태'}
+
+# Attribute names for the business columns, which are not valid identifiers
+_BUSINESS_SLOTS = tuple(f'f{i}' for i in range(len(BUSINESS_COLUMNS)))
+_BUSINESS_INDEX = {col: i for i, col in enumerate(BUSINESS_COLUMNS)}
+
+
+# Slotted record for one Naver place row
+class PlaceRecord:
+    __slots__ = ('searchedPhoneNumber', 'name', 'tel', 'category', 'roadAddress', 'status')
+
+    def __init__(self, searchedPhoneNumber, name, tel, category, roadAddress, status=STATUS_OK):
+        self.searchedPhoneNumber = searchedPhoneNumber
+        self.name = name
+        self.tel = tel
+        self.category = sys.intern(category)
+        self.roadAddress = roadAddress
+        self.status = status
+
+    @classmethod
+    def no_result(cls, phone_number, status=STATUS_NO_RESULT):
+        return cls(phone_number, NO_RESULT, NO_RESULT, NO_RESULT, NO_RESULT, status)
+
+    def as_tuple(self):
+        return (self.searchedPhoneNumber, self.name, self.tel, self.category, self.roadAddress)
+
+
+# Slotted record for one business registration row; unset fields share the empty string
+class BusinessRecord:
+    __slots__ = _BUSINESS_SLOTS
+
+    def __init__(self, values=()):
+        for slot in _BUSINESS_SLOTS:
+            setattr(self, slot, '')
+        for col, value in values:
+            self[col] = value
+
+    def __getitem__(self, col):
+        return getattr(self, _BUSINESS_SLOTS[_BUSINESS_INDEX[col]])
+
+    def __setitem__(self, col, value):
+        if col in _BUSINESS_INDEX:
+            if col in INTERNED_BUSINESS_COLUMNS:
+                value = sys.intern(value)
+            setattr(self, _BUSINESS_SLOTS[_BUSINESS_INDEX[col]], value)
+
+    @classmethod
+    def from_table(cls, table_data, phone_number, name, h4_text):
+        record = cls(table_data.items())
+        record['SearchedPhoneNumber'] = phone_number
+        record['name'] = name
+        record['h4텍스트'] = h4_text
+        return record
+
+    @classmethod
+    def no_result(cls, phone_number):
+        return cls((('SearchedPhoneNumber', phone_number), ('name', NO_RESULT)))
+
+    def as_tuple(self):
+        return tuple(getattr(self, slot) for slot in _BUSINESS_SLOTS)
+
+
+# Function to normalize a phone number to its digits, so '02-123-4567' and '02 123 4567' are the same lookup
+def normalize_phone(phone_number):
+    return re.sub(r'\D', '', phone_number)
+
+
+# Function to clean name
+def clean_name(name):
+    name = re.sub(r'\d+', '', name)
+    name = re.sub(r'\(.*?\)', '', name)
+    name = name.strip()
+    return name
+
+
+# Function to reduce a place name to the base name the bizno search uses: cleaned, first word only
+def base_name(name):
+    name = clean_name(name)
+    return name.split()[0] if name else name
+
+
+# Function to convert place records to the extracted DataFrame
+def places_to_frame(records):
+    return pd.DataFrame.from_records((record.as_tuple() for record in records), columns=EXTRACTED_COLUMNS)
+
+
+# Function to convert business records to the business DataFrame
+def business_to_frame(records):
+    return pd.DataFrame.from_records((record.as_tuple() for record in records), columns=BUSINESS_COLUMNS)
@@ -0,0 +1,126 @@
+import argparse
+import json
+import math
+from collections import Counter
+
+from lookup_cache import BIZNO_ARTICLE, BIZNO_MISS, BIZNO_SEARCH, NAVER_MISS, NAVER_PLACES, get_cache
+from phone_ingest import iter_phone_numbers
+from records import NO_RESULT, base_name, normalize_phone
+from upstream import INITIAL_CONCURRENCY, RETRY_BUDGET_RATIO, concurrency_limits, get_latency_tracker
+
+# Seconds per request assumed for a host this process has too few latency samples of
+ASSUMED_LATENCY = 1.0
+
+# Article links per bizno search (max_results in lookup_business), used until cached searches show the usual count
+ASSUMED_LINKS_PER_SEARCH = 3
+
+
+# Function to estimate how long a host takes for a number of requests at its current concurrency limit
+def estimate_seconds(host, requests_count):
+    observed = get_latency_tracker(host).percentiles(0.5)
+    latency = observed[0.5] if observed else ASSUMED_LATENCY
+    concurrency = concurrency_limits().get(host, INITIAL_CONCURRENCY)
+    return math.ceil(requests_count / concurrency) * latency
+
+
+# Function to plan a run without sending anything: normalizes and dedups the numbers, checks them and their likely
+# business names against the lookup cache, and estimates the Naver and bizno requests and the runtime
+def plan_lookups(phone_numbers, naver_host='map.naver.com', bizno_host='bizno.net'):
+    cache = get_cache()
+    seen = set()
+    total = invalid = 0
+    naver = Counter()
+    names = set()
+    for phone_number in phone_numbers:
+        total += 1
+        normalized = normalize_phone(phone_number)
+        if not normalized:
+            invalid += 1
+            continue
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+
+        # Naver entries are keyed by the digits of the number, however it was written
+        if cache.get(NAVER_MISS, normalized, count_hit=False) is not None:
+            naver['known_miss'] += 1
+            continue
+        places = cache.get(NAVER_PLACES, normalized, count_hit=False)
+        if places is None:
+            naver['requests'] += 1
+            continue
+        naver['cached'] += 1
+        # The same most common base name refine_places would pick
+        name = Counter(base_name(place[0]) for place in places).most_common(1)[0][0]
+        if name != NO_RESULT:
+            names.add(name)
+
+    bizno = Counter()
+    link_counts = []
+    for name in names:
+        if cache.get(BIZNO_MISS, name, count_hit=False) is not None:
+            bizno['known_miss'] += 1
+            continue
+        links = cache.get(BIZNO_SEARCH, name, count_hit=False)
+        if links is None:
+            bizno['search_requests'] += 1
+            continue
+        bizno['search_cached'] += 1
+        link_counts.append(len(links))
+        for link, _ in links:
+            entry = cache.get_stale(BIZNO_ARTICLE, link, count_hit=False)
+            if entry is None:
+                bizno['article_requests'] += 1
+            elif entry['fresh']:
+                bizno['article_cached'] += 1
+            else:
+                bizno['article_revalidations'] += 1
+
+    # Numbers Naver still has to answer lead to names nobody knows yet; assume they find places as often as
+    # the cached numbers did, and that every search is as long as the cached ones
+    answered = naver['cached'] + naver['known_miss']
+    hit_rate = naver['cached'] / answered if answered else 1.0
+    links_per_search = sum(link_counts) / len(link_counts) if link_counts else ASSUMED_LINKS_PER_SEARCH
+    unknown_names = math.ceil(naver['requests'] * hit_rate)
+    bizno['search_requests'] += unknown_names
+    # Articles behind searches that have not run yet are counted as full downloads
+    bizno['article_requests'] += math.ceil(bizno['search_requests'] * links_per_search)
+
+    naver_requests = naver['requests']
+    bizno_requests = bizno['search_requests'] + bizno['article_requests'] + bizno['article_revalidations']
+    # The two stages run one after the other; retries are capped at RETRY_BUDGET_RATIO of the requests sent
+    seconds = estimate_seconds(naver_host, naver_requests) + estimate_seconds(bizno_host, bizno_requests)
+    return {
+        'input': total,
+        'unique': len(seen),
+        'duplicates': total - invalid - len(seen),
+        'invalid': invalid,
+        'naver': {'requests': naver_requests, 'cached': naver['cached'], 'known_miss': naver['known_miss']},
+        'bizno': {
+            'requests': bizno_requests,
+            'names': len(names) + unknown_names,
+            'known_miss': bizno['known_miss'],
+            'search_requests': bizno['search_requests'],
+            'search_cached': bizno['search_cached'],
+            'article_requests': bizno['article_requests'],
+            'article_revalidations': bizno['article_revalidations'],
+            'article_cached': bizno['article_cached'],
+        },
+        'estimated_seconds': round(seconds, 1),
+        'estimated_seconds_with_retries': round(seconds * (1 + RETRY_BUDGET_RATIO), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="요청을 보내지 않고 전화번호 리스트의 예상 Naver/bizno 요청 수와 소요 시간을 계산합니다.")
+    parser.add_argument('input')
+    parser.add_argument('--column', help="CSV/XLSX 입력에서 전화번호 열 이름")
+    args = parser.parse_args()
+
+    with open(args.input, 'rb') as f:
+        plan = plan_lookups(iter_phone_numbers(f, args.input, args.column))
+    print(json.dumps(plan, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
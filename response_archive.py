@@ -0,0 +1,114 @@
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+
+# Archive of raw upstream responses, so outputs can be rebuilt offline after a parser fix; off when unset
+ARCHIVE_PATH = os.environ.get('RESPONSE_ARCHIVE')
+
+# Uncompressed bytes gathered before they are compressed and appended as one gzip member; bigger members
+# compress better, since similar pages share one dictionary
+MEMBER_BYTES = 1024 * 1024
+
+# Seconds between writes of a partly filled member, so a long-lived process does not hold finished runs'
+# responses in memory; a killed process loses at most this much of its buffer
+FLUSH_INTERVAL = 30.0
+
+# Kinds of archived responses, keyed by the phone number, business name and article link they answered
+NAVER_PLACES_RESPONSE = 'naver'
+BIZNO_SEARCH_RESPONSE = 'bizno_search'
+BIZNO_ARTICLE_RESPONSE = 'bizno_article'
+
+
+# Append-only archive of gzip members, each holding records of a JSON header line followed by the raw body.
+# Concatenated gzip members read back as one stream, so the file can be appended to across runs
+class ResponseArchive:
+    def __init__(self, path, member_bytes=MEMBER_BYTES):
+        self.path = path
+        self.member_bytes = member_bytes
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+
+    def append(self, kind, key, body):
+        header = json.dumps({'kind': kind, 'key': key, 'at': time.time(), 'size': len(body)}, ensure_ascii=False)
+        with self._lock:
+            self._buffer += header.encode('utf-8') + b'\n' + body + b'\n'
+            if len(self._buffer) >= self.member_bytes:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        member = gzip.compress(bytes(self._buffer))
+        # One write on an O_APPEND descriptor, so members from several processes sharing the file do not interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, member)
+        finally:
+            os.close(fd)
+        self._buffer = bytearray()
+
+
+_archive = ResponseArchive(ARCHIVE_PATH) if ARCHIVE_PATH else None
+
+
+# Function to write out the buffer every interval seconds, for the life of the process
+def _flush_periodically(archive, interval=FLUSH_INTERVAL):
+    while True:
+        time.sleep(interval)
+        try:
+            archive.flush()
+        except OSError as e:
+            print(f"응답 아카이브 저장 실패 ({archive.path}): {e}")
+
+
+if _archive is not None:
+    threading.Thread(target=_flush_periodically, args=(_archive,), name='archive-flush', daemon=True).start()
+
+
+# Function to keep a raw response body in the archive, if archiving is on
+def archive_response(kind, key, body):
+    if _archive is not None and body is not None:
+        _archive.append(kind, key, body)
+
+
+# Function to write out buffered responses
+def flush_archive():
+    if _archive is not None:
+        _archive.flush()
+
+
+atexit.register(flush_archive)
+
+
+# Function to read archived responses of one kind as (key, archived_at, body), oldest first per file;
+# a member cut off by a killed process ends that file instead of failing the whole read
+def read_archive(paths, kind):
+    for path in paths:
+        with gzip.open(path, 'rb') as f:
+            try:
+                for line in f:
+                    header = json.loads(line)
+                    body = f.read(header['size'])
+                    f.read(1)  # newline after the body
+                    if header['kind'] == kind:
+                        yield header['key'], header['at'], body
+            except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+                print(f"아카이브 끝부분이 손상되어 이후 내용을 건너뜁니다 ({path}): {e}")
+
+
+# Function to get the latest archived body per key, for the wanted keys only (all keys when wanted is None)
+def latest_responses(paths, kind, wanted=None):
+    latest = {}
+    for key, archived_at, body in read_archive(paths, kind):
+        if wanted is not None and key not in wanted:
+            continue
+        if key not in latest or archived_at >= latest[key][0]:
+            latest[key] = (archived_at, body)
+    return {key: body for key, (_, body) in latest.items()}
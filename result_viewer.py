@@ -0,0 +1,46 @@
+import math
+
+import streamlit as st
+
+# Columns the viewer can filter and sort on, when a dataset has them
+VIEW_COLUMNS = ('searchedPhoneNumber', 'SearchedPhoneNumber', 'name', 'category', '사업자등록번호', 'change')
+
+PAGE_SIZES = (50, 100, 500, 1000)
+
+
+# Function to filter a dataset by a substring of one column and sort it, without copying unneeded rows
+def query_frame(df, filter_column=None, text='', sort_column=None, ascending=True):
+    if filter_column and text:
+        df = df[df[filter_column].astype(str).str.contains(text, case=False, regex=False, na=False)]
+    if sort_column:
+        df = df.sort_values(sort_column, ascending=ascending, kind='stable')
+    return df
+
+
+# Function to cut one page out of a dataset; page is 1-based
+def page_slice(df, page, page_size):
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
+
+
+# Function to show a dataset one page at a time; filtering, sorting and slicing happen on the server,
+# so only the visible rows are sent to the browser
+def show_paginated(df, key):
+    columns = [col for col in VIEW_COLUMNS if col in df.columns]
+    filter_col, text_col, sort_col, order_col = st.columns([2, 3, 2, 1])
+    filter_column = filter_col.selectbox("필터 열", columns, key=f'{key}_filter_column') if columns else None
+    text = text_col.text_input("포함 문자열", key=f'{key}_filter_text').strip()
+    sort_column = sort_col.selectbox("정렬 열", ['(입력 순서)'] + columns, key=f'{key}_sort_column')
+    ascending = order_col.radio("순서", ('오름차순', '내림차순'), key=f'{key}_order', label_visibility='collapsed') == '오름차순'
+
+    view = query_frame(df, filter_column, text, None if sort_column == '(입력 순서)' else sort_column, ascending)
+
+    size_col, page_col, info_col = st.columns([1, 1, 3])
+    page_size = size_col.selectbox("페이지 크기", PAGE_SIZES, key=f'{key}_page_size')
+    pages = max(1, math.ceil(len(view) / page_size))
+    if st.session_state.get(f'{key}_page', 1) > pages:
+        # A narrower filter or a bigger page can leave the remembered page past the end
+        st.session_state[f'{key}_page'] = pages
+    page = page_col.number_input("페이지", min_value=1, max_value=pages, key=f'{key}_page')
+    info_col.caption(f"{len(view)}행 중 {(page - 1) * page_size + 1 if len(view) else 0}–{min(page * page_size, len(view))}행 (전체 {len(df)}행, {pages}페이지)")
+    st.dataframe(page_slice(view, page, page_size))
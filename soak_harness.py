@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import random
+import resource
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Default share of responses for each injected fault
+DEFAULT_FAULTS = {
+    'throttle': 0.02,   # 429/503, as Naver and bizno answer when overloaded
+    'malformed': 0.01,  # invalid JSON from allSearch
+    'truncated': 0.01,  # article HTML cut off inside the company table
+    'slow': 0.02,       # answered after SLOW_SECONDS
+    'reset': 0.01,      # connection reset without an answer
+}
+SLOW_SECONDS = 3.0
+
+# Seconds of the run whose samples are excluded from the growth and throughput baselines (caches, pools warming up)
+WARMUP_SECONDS = 120
+
+ARTICLE_FILLER = b'<div class="ad">' + b'x' * 20000 + b'</div>'
+
+# Syllable per digit, so every number gets its own place name; refining strips digits from names
+NAME_SYLLABLES = '영일이삼사오육칠팔구'
+
+
+# Local stand-in for map.naver.com and bizno.net that answers like the real sites, except for injected faults
+class FaultyUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _fault(self, *kinds):
+        roll = self.server.random.random()
+        for kind in kinds:
+            roll -= self.server.faults.get(kind, 0.0)
+            if roll < 0:
+                self.server.count(kind)
+                return kind
+        return None
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        fault = self._fault('throttle', 'slow', 'reset', 'malformed' if url.path.endswith('/allSearch') else 'truncated')
+        if fault == 'reset':
+            # Linger 0 makes close() send a RST instead of a FIN
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.close_connection = True
+            return
+        if fault == 'throttle':
+            self._send(self.server.random.choice((429, 503)), b'', 'text/plain')
+            return
+        if fault == 'slow':
+            time.sleep(SLOW_SECONDS)
+
+        if url.path.endswith('/allSearch'):
+            phone_number = query.get('query', [''])[0]
+            if fault == 'malformed':
+                self._send(200, b'{"result": {"place": {"list": [', 'application/json')
+            elif phone_number.endswith('0'):
+                self._send(200, json.dumps({'result': {'place': None}}).encode('utf-8'), 'application/json')
+            else:
+                syllables = ''.join(NAME_SYLLABLES[int(digit)] for digit in phone_number if '0' <= digit <= '9')
+                place = {'name': f'테스트상사{syllables} 본점', 'tel': phone_number, 'category': ['도매'], 'roadAddress': '서울'}
+                self._send(200, json.dumps({'result': {'place': {'list': [place]}}}, ensure_ascii=False).encode('utf-8'), 'application/json')
+        elif url.path == '/':
+            name = query.get('query', [''])[0]
+            body = f'<div class="titles"><a href="/article/{name}"><h4>(주){name}</h4></a></div>'.encode('utf-8')
+            self._send(200, body, 'text/html; charset=utf-8')
+        else:
+            table = ('<table class="table_guide01"><tr><th>사업자등록번호</th><td>123-45-67890</td></tr>'
+                     '<tr><th>업태</th><td>도매</td></tr></table>').encode('utf-8')
+            if fault == 'truncated':
+                table = table[:len(table) // 2]
+            self._send(200, b'<html><body>' + table + ARTICLE_FILLER + b'</body></html>', 'text/html; charset=utf-8')
+
+
+class FaultyUpstream(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, faults, seed=None, host='127.0.0.1', port=0):
+        super().__init__((host, port), FaultyUpstreamHandler)
+        self.faults = faults
+        self.random = random.Random(seed)
+        self.injected = {}
+        self._lock = threading.Lock()
+
+    def count(self, kind):
+        with self._lock:
+            self.injected[kind] = self.injected.get(kind, 0) + 1
+
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+
+# Function to read the resident set size of this process in MB
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        # Peak rather than current RSS, but enough to see unbounded growth where /proc is missing
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+# Function to sum a counter over all its label combinations
+def counter_total(snapshot, name):
+    return sum(value for key, value in snapshot['counters'].items() if key == name or key.startswith(name + '{'))
+
+
+# Function to make phone numbers that were never looked up before, so every batch reaches the upstream
+def fresh_numbers(rng, count):
+    return [f'010{rng.randrange(10 ** 8):08d}' for _ in range(count)]
+
+
+# Function to compare the run against the thresholds; returns the list of violations
+def check_thresholds(samples, max_rss_growth_mb, min_throughput_ratio):
+    measured = [s for s in samples if s['elapsed'] >= WARMUP_SECONDS] or samples
+    if len(measured) < 2:
+        return []
+    violations = []
+    growth = measured[-1]['rss_mb'] - measured[0]['rss_mb']
+    if growth > max_rss_growth_mb:
+        violations.append(f"RSS 증가 {growth:.1f}MB > 허용 {max_rss_growth_mb}MB")
+    # Compare the first and last quarter of the measured samples, so one slow batch does not decide it
+    window = max(1, len(measured) // 4)
+    first = sum(s['throughput'] for s in measured[:window]) / window
+    last = sum(s['throughput'] for s in measured[-window:]) / window
+    if first > 0 and last / first < min_throughput_ratio:
+        violations.append(f"처리량 저하 {last:.2f}/{first:.2f}건/초 < 허용 비율 {min_throughput_ratio}")
+    return violations
+
+
+# Function to run batches against the faulty stand-in until the duration is over, sampling after every batch
+def run_soak(duration, batch_size, faults, seed, report_path):
+    upstream_server = FaultyUpstream(faults, seed)
+    threading.Thread(target=upstream_server.serve_forever, daemon=True).start()
+
+    # The app reads its upstreams and cache location at import time
+    os.environ['NAVER_BASE_URL'] = upstream_server.base_url
+    os.environ['BIZNO_BASE_URL'] = upstream_server.base_url
+    os.environ.setdefault('LOOKUP_CACHE_PATH', os.path.join(tempfile.mkdtemp(prefix='soak_'), 'lookup_cache.sqlite3'))
+    from app_6_21 import run_pipeline
+    from metrics import METRICS
+
+    rng = random.Random(seed)
+    samples = []
+    started = time.monotonic()
+    previous = METRICS.snapshot()
+    with open(report_path, 'w', encoding='utf-8') as report:
+        while time.monotonic() - started < duration:
+            batch_started = time.monotonic()
+            df, grouped, business_df = run_pipeline(fresh_numbers(rng, batch_size), report=lambda message: None)
+            batch_seconds = time.monotonic() - batch_started
+
+            current = METRICS.snapshot()
+            requests_sent = counter_total(current, 'upstream_requests') - counter_total(previous, 'upstream_requests')
+            sample = {
+                'elapsed': round(time.monotonic() - started, 1),
+                'rss_mb': round(rss_mb(), 1),
+                'throughput': round(batch_size / batch_seconds, 3),
+                'requests': requests_sent,
+                'retry_rate': round((counter_total(current, 'retries_scheduled') - counter_total(previous, 'retries_scheduled')) / max(requests_sent, 1), 4),
+                'error_rate': round((counter_total(current, 'upstream_errors') - counter_total(previous, 'upstream_errors')) / max(requests_sent, 1), 4),
+                'no_result_rows': int((df['name'] == '검색결과없음').sum()),
+                'injected': dict(upstream_server.injected),
+            }
+            previous = current
+            samples.append(sample)
+            report.write(json.dumps(sample, ensure_ascii=False) + '\n')
+            report.flush()
+            print(f"[{sample['elapsed']:>8.0f}s] RSS {sample['rss_mb']}MB, {sample['throughput']}건/초, "
+                  f"재시도 {sample['retry_rate']:.2%}, 오류 {sample['error_rate']:.2%}")
+
+    upstream_server.shutdown()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="장애를 주입하는 가짜 업스트림으로 파이프라인을 장시간 실행하여 메모리 누수와 처리량 저하를 점검합니다.")
+    parser.add_argument('--duration', type=float, default=12 * 60 * 60, help="실행 시간(초)")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--report', default='soak_report.jsonl', help="배치마다 측정값을 기록할 JSONL 파일")
+    parser.add_argument('--max-rss-growth-mb', type=float, default=200.0)
+    parser.add_argument('--min-throughput-ratio', type=float, default=0.7, help="마지막/처음 구간 처리량의 최소 비율")
+    for kind, rate in DEFAULT_FAULTS.items():
+        parser.add_argument(f'--{kind}-rate', type=float, default=rate)
+    args = parser.parse_args()
+
+    faults = {kind: getattr(args, f'{kind}_rate') for kind in DEFAULT_FAULTS}
+    samples = run_soak(args.duration, args.batch_size, faults, args.seed, args.report)
+    violations = check_thresholds(samples, args.max_rss_growth_mb, args.min_throughput_ratio)
+    for violation in violations:
+        print(f"실패: {violation}")
+    if violations:
+        sys.exit(1)
+    print(f"통과: {len(samples)}개 배치")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from records import normalize_phone
+
+# Trace file in Chrome trace-event format (chrome://tracing, Perfetto, speedscope); tracing is off when unset.
+# A {pid} placeholder gives every worker process its own file
+TRACE_PATH = os.environ.get('TRACE_PATH')
+
+# Share of phone numbers traced; the choice is a hash of the number, so every stage picks the same numbers
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+
+# Events buffered before they are written out
+FLUSH_EVERY = 1000
+
+# Track for spans that cover a whole stage rather than one number
+PIPELINE_TRACK = 0
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span_args = contextvars.ContextVar('current_span_args', default=None)
+_epoch = time.perf_counter()
+
+
+# Appends trace events to a JSON array file; viewers accept the array without its closing bracket,
+# so a run that is killed still leaves a loadable trace
+class TraceWriter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._named_tracks = set()
+        self._file = None
+
+    def emit(self, event):
+        with self._lock:
+            self._buffer.append(json.dumps(event, ensure_ascii=False))
+            if len(self._buffer) >= FLUSH_EVERY:
+                self._flush_locked()
+
+    # Labels a track with the phone number it follows, once per track
+    def name_track(self, track, name):
+        with self._lock:
+            if track in self._named_tracks:
+                return
+            self._named_tracks.add(track)
+        self.emit({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': track, 'args': {'name': name}})
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._file.write('[\n')
+        self._file.write(',\n'.join(self._buffer) + ',\n')
+        self._file.flush()
+        self._buffer = []
+
+
+_writer = None
+_sample_rate = TRACE_SAMPLE_RATE
+
+
+# Function to turn tracing on (or off with path=None) for this process
+def configure(path, sample_rate=TRACE_SAMPLE_RATE):
+    global _writer, _sample_rate
+    if _writer is not None:
+        _writer.flush()
+    _writer = TraceWriter(path.format(pid=os.getpid())) if path else None
+    _sample_rate = sample_rate
+    if _writer is not None:
+        _writer.name_track(PIPELINE_TRACK, 'pipeline')
+
+
+# Function to tell whether tracing is on
+def enabled():
+    return _writer is not None
+
+
+def _now_us():
+    return (time.perf_counter() - _epoch) * 1_000_000
+
+
+# Function to make a phone number's track ID, stable across stages and processes
+def _track_id(key):
+    return zlib.crc32(key.encode('utf-8')) % 2_000_000_000 + 1
+
+
+# Context manager that makes the spans inside it belong to one phone number's trace, if that number is sampled
+@contextmanager
+def traced(phone_number):
+    key = normalize_phone(phone_number) if _writer is not None and phone_number else ''
+    if not key or (zlib.crc32(key.encode('utf-8')) % 10000) >= _sample_rate * 10000:
+        yield
+        return
+    track = _track_id(key)
+    _writer.name_track(track, key)
+    token = _current_trace.set(track)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+
+# Context manager that records a timed span on the current trace; the yielded dict becomes the span's args,
+# so callers can add cache hit/miss, status and the like while it runs
+@contextmanager
+def span(name, /, **args):
+    track = _current_trace.get()
+    if track is None or _writer is None:
+        yield args
+        return
+    start = _now_us()
+    token = _current_span_args.set(args)
+    try:
+        yield args
+    except BaseException as e:
+        args['error'] = type(e).__name__
+        raise
+    finally:
+        _current_span_args.reset(token)
+        _writer.emit({'name': name, 'cat': 'lookup', 'ph': 'X', 'ts': round(start, 1), 'dur': round(_now_us() - start, 1),
+                      'pid': os.getpid(), 'tid': track, 'args': args})
+
+
+# Context manager for a span covering a whole stage, on the pipeline track; recorded whenever tracing is on
+@contextmanager
+def stage_span(name, /, **args):
+    if _writer is None:
+        yield args
+        return
+    token = _current_trace.set(PIPELINE_TRACK)
+    try:
+        with span(name, **args) as stage_args:
+            yield stage_args
+    finally:
+        _current_trace.reset(token)
+
+
+# Function to add args (cache hit/miss, status, sizes) to the innermost open span, if it is being recorded
+def annotate(**args):
+    current = _current_span_args.get()
+    if current is not None:
+        current.update(args)
+
+
+# Function to record a point-in-time event on the current trace
+def mark(name, /, **args):
+    track = _current_trace.get()
+    if track is None or _writer is None:
+        return
+    _writer.emit({'name': name, 'cat': 'lookup', 'ph': 'i', 's': 't', 'ts': round(_now_us(), 1), 'pid': os.getpid(), 'tid': track, 'args': args})
+
+
+# Function to write out buffered events
+def flush():
+    if _writer is not None:
+        _writer.flush()
+
+
+configure(TRACE_PATH, TRACE_SAMPLE_RATE)
+atexit.register(flush)
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from upstream import ACCEPT_ENCODING, MAX_CONCURRENCY, build_session
+
+# Seconds between samples of the process's open sockets
+SOCKET_SAMPLE_INTERVAL = 0.05
+
+
+# Function to count the sockets this process has open; None where /proc is missing
+def open_sockets():
+    try:
+        fds = os.listdir('/proc/self/fd')
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            count += os.readlink(f'/proc/self/fd/{fd}').startswith('socket:')
+        except OSError:
+            pass
+    return count
+
+
+# Function to send the same GET many times at a fixed concurrency and measure one transport
+def run_transport(session, url, total, concurrency, timeout):
+    headers = {'Accept-Encoding': ACCEPT_ENCODING, 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
+    baseline = open_sockets()
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample_sockets():
+        while not done.wait(SOCKET_SAMPLE_INTERVAL):
+            current = open_sockets()
+            if current is not None:
+                peak[0] = max(peak[0], current)
+
+    def fetch(_):
+        start = time.monotonic()
+        try:
+            response = session.get(url, headers=headers, timeout=timeout, verify=session.verify)
+            response.content
+        except requests.RequestException as e:
+            return None, type(e).__name__, time.monotonic() - start
+        return response.raw.version, response.status_code, time.monotonic() - start
+
+    sampler = threading.Thread(target=sample_sockets, daemon=True)
+    if baseline is not None:
+        sampler.start()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, range(total)))
+    elapsed = time.monotonic() - started
+    done.set()
+
+    latencies = sorted(latency for _, _, latency in results)
+    return {
+        'requests': total,
+        'seconds': round(elapsed, 2),
+        'requests_per_second': round(total / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+        'outcomes': dict(Counter(str(outcome) for _, outcome, _ in results)),
+        'http_versions': dict(Counter(f'{version // 10}.{version % 10}' if version else 'error' for version, _, _ in results)),
+        'peak_sockets': peak[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="같은 URL에 동시 요청을 보내 HTTP/1.1 연결 풀과 HTTP/2 다중화 전송을 비교합니다.")
+    parser.add_argument('url', help="요청할 HTTPS URL (업스트림에 부담을 주지 않도록 요청 수를 조절하세요)")
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--insecure', action='store_true', help="인증서 검증 생략 (자체 서명 인증서를 쓰는 테스트 서버용)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, http2 in (('http1.1', False), ('http2', True)):
+        session = build_session(http2=http2, verify=not args.insecure)
+        # One untimed request opens the first connection, so both runs start warm
+        session.get(args.url, headers={'Accept-Encoding': ACCEPT_ENCODING}, timeout=args.timeout, verify=session.verify).content
+        results[name] = run_transport(session, args.url, args.requests, args.concurrency, args.timeout)
+        session.close()
+        print(f"{name}: {results[name]['requests_per_second']}건/초, p50 {results[name]['p50_ms']}ms, "
+              f"p99 {results[name]['p99_ms']}ms, 최대 소켓 {results[name]['peak_sockets']}개, 버전 {results[name]['http_versions']}")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,594 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING as DECODABLE_ENCODINGS
+
+from http2_adapter import HTTP2Adapter, PoolTimeout, http2_available
+from metrics import METRICS
+
+# Status codes that mean the upstream wants us to slow down
+THROTTLE_STATUS_CODES = {403, 429, 503}
+
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+# Seconds of responses whose fastest one is the no-queueing latency the limiter compares against
+LATENCY_BASELINE_WINDOW = 60.0
+
+# Hosts a session keeps connections to at once; each may have up to MAX_CONCURRENCY requests in flight
+POOL_HOSTS = 8
+
+# Circuit breaker settings: consecutive failures before opening, and seconds before a trial probe
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+HALF_OPEN_PROBES = 1
+
+# Retries of transient failures: capped exponential backoff with full jitter, and a per-host budget that
+# earns RETRY_BUDGET_RATIO of a retry per request sent, so retries stay a bounded share of upstream traffic
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+RETRY_BUDGET_RATIO = float(os.environ.get('RETRY_BUDGET_RATIO', 0.1))
+RETRY_BUDGET_RESERVE = 10.0
+
+# Timeouts (seconds) used until a host has enough latency samples, and the bounds adaptive timeouts stay within
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+MIN_CONNECT_TIMEOUT, MAX_CONNECT_TIMEOUT = 1.0, 10.0
+MIN_READ_TIMEOUT, MAX_READ_TIMEOUT = 3.0, 60.0
+LATENCY_WINDOW = 512
+MIN_LATENCY_SAMPLES = 20
+
+# Send one duplicate of a request still unanswered after the host's p95 latency, if a slot is free
+HEDGE_REQUESTS = os.environ.get('HEDGE_REQUESTS', '0') == '1'
+HEDGE_PERCENTILE = 0.95
+# Slots past a host's limit kept for duplicates while every slot is taken, as a share of the limit (at least one);
+# each one used is paid from the host's retry budget
+HEDGE_SHARE = 0.1
+
+
+# Send HTTPS requests over multiplexed HTTP/2 connections instead of pooled HTTP/1.1; needs httpx[http2] 0.27.1
+# or later, which is not in requirements.txt since the transport is opt-in
+HTTP2_TRANSPORT = os.environ.get('UPSTREAM_HTTP2', '0') == '1'
+
+# Content codings to advertise: only those this process can decode (br needs brotli, zstd needs zstandard),
+# since an undecodable body would reach the parsers as compressed bytes. urllib3's list also holds for the
+# HTTP/2 transport, as httpx (from MIN_HTTPX_VERSION on) decodes the same codings with the same libraries
+ACCEPT_ENCODING = ', '.join(DECODABLE_ENCODINGS.split(','))
+
+
+# Request priorities: interactive lookups are served before any queued batch work, and background
+# refreshes only get slots nobody else is waiting for
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_BACKGROUND = 2
+
+# Share of a host's concurrency limit background requests may hold at once (at least one slot)
+BACKGROUND_SHARE = float(os.environ.get('BACKGROUND_SHARE', 0.1))
+
+_request_priority = contextvars.ContextVar('request_priority', default=(PRIORITY_BATCH, 'default'))
+
+
+# Context manager that tags every upstream request made inside it with a priority and job id
+@contextmanager
+def request_priority(priority, job_id='default'):
+    token = _request_priority.set((priority, job_id))
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+# Raised instead of sending a request while a host's circuit is open
+class CircuitOpenError(Exception):
+    def __init__(self, host):
+        super().__init__(f"{host} 회로가 열려 있어 요청을 보류합니다.")
+        self.host = host
+
+
+# AIMD limit on in-flight requests to one host; free slots go to interactive waiters first,
+# then round-robin across batch jobs so one large upload cannot starve another, then to background work
+class AdaptiveLimiter:
+    def __init__(self, host, initial_limit=INITIAL_CONCURRENCY, min_limit=MIN_CONCURRENCY, max_limit=MAX_CONCURRENCY,
+                 backoff=0.5, latency_tolerance=2.0):
+        self.host = host
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._interactive = deque()
+        self._batch_jobs = OrderedDict()
+        self._background = deque()
+        self.background_in_flight = 0
+        self._baseline_samples = deque()  # (time, latency), latencies increasing, for the windowed minimum
+        self._smoothed_latency = None
+        self._last_decrease = 0.0
+        self._publish()
+
+    def _publish(self):
+        METRICS.set_gauge('upstream_concurrency_limit', int(self.limit), host=self.host)
+        METRICS.set_gauge('upstream_in_flight', self.in_flight, host=self.host)
+        METRICS.set_gauge('upstream_waiting', len(self._interactive), host=self.host, priority='interactive')
+        METRICS.set_gauge('upstream_waiting', sum(len(q) for q in self._batch_jobs.values()), host=self.host, priority='batch')
+        METRICS.set_gauge('upstream_waiting', len(self._background), host=self.host, priority='background')
+
+    def _next_waiter(self):
+        if self._interactive:
+            return self._interactive[0]
+        if self._batch_jobs:
+            return next(iter(self._batch_jobs.values()))[0]
+        if self._background:
+            return self._background[0]
+        return None
+
+    def _background_full(self):
+        return self.background_in_flight >= max(1, int(self.limit * BACKGROUND_SHARE))
+
+    def acquire(self, priority=PRIORITY_BATCH, job_id='default'):
+        ticket = object()
+        with self._cond:
+            if priority == PRIORITY_INTERACTIVE:
+                self._interactive.append(ticket)
+            elif priority == PRIORITY_BACKGROUND:
+                self._background.append(ticket)
+            else:
+                self._batch_jobs.setdefault(job_id, deque()).append(ticket)
+            self._publish()
+            while (self.in_flight >= int(self.limit) or self._next_waiter() is not ticket
+                   or (priority == PRIORITY_BACKGROUND and self._background_full())):
+                self._cond.wait()
+
+            if priority == PRIORITY_INTERACTIVE:
+                self._interactive.popleft()
+            elif priority == PRIORITY_BACKGROUND:
+                self._background.popleft()
+                self.background_in_flight += 1
+            else:
+                queue = self._batch_jobs.pop(job_id)
+                queue.popleft()
+                if queue:
+                    # Re-append so the job goes to the back of the round-robin
+                    self._batch_jobs[job_id] = queue
+            self.in_flight += 1
+            self._publish()
+            # The next waiter in line may be able to take another free slot
+            self._cond.notify_all()
+
+    # Takes a slot for a hedged duplicate without waiting: a free slot no foreground request is waiting for,
+    # or with reserve=True one of the HEDGE_SHARE slots past the limit, as batch runs keep every slot taken
+    def try_acquire(self, reserve=False):
+        with self._cond:
+            free = self.in_flight < int(self.limit) and not (self._interactive or self._batch_jobs)
+            if not free and (not reserve or self.in_flight >= int(self.limit) + max(1, int(self.limit * HEDGE_SHARE))):
+                return False
+            self.in_flight += 1
+            self._publish()
+            return True
+
+    # Frees a slot without judging the upstream, for requests that failed before reaching it
+    def cancel(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._publish()
+            self._cond.notify_all()
+
+    # Called once a background request is over, after its slot was released or cancelled
+    def background_done(self):
+        with self._cond:
+            self.background_in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, status_code, latency):
+        with self._cond:
+            self.in_flight -= 1
+            if status_code is None or status_code in THROTTLE_STATUS_CODES or self._latency_rising(latency):
+                self._decrease()
+            elif status_code < 500:
+                # Additive increase: about one extra slot per limit's worth of healthy responses
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._publish()
+            self._cond.notify_all()
+
+    def _latency_rising(self, latency):
+        # The baseline is the fastest response of the last LATENCY_BASELINE_WINDOW seconds, so once an upstream
+        # gets slower for good (or one response came back unusually fast) the baseline follows within a window
+        now = time.monotonic()
+        samples = self._baseline_samples
+        while samples and samples[-1][1] >= latency:
+            samples.pop()
+        samples.append((now, latency))
+        while samples[0][0] < now - LATENCY_BASELINE_WINDOW:
+            samples.popleft()
+        if self._smoothed_latency is None:
+            self._smoothed_latency = latency
+            return False
+        self._smoothed_latency += 0.1 * (latency - self._smoothed_latency)
+        return self._smoothed_latency > samples[0][1] * self.latency_tolerance
+
+    def _decrease(self):
+        # Back off at most once per round trip, so one burst of bad responses counts once
+        now = time.monotonic()
+        if now - self._last_decrease < (self._smoothed_latency or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+
+
+# Per-host circuit breaker: closed -> open after repeated failures -> half-open probes -> closed
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, host, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, half_open_probes=HALF_OPEN_PROBES):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self._lock = threading.Lock()
+        self._publish()
+
+    def _publish(self):
+        METRICS.set_gauge('upstream_circuit_open', int(self.state != self.CLOSED), host=self.host)
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.probes_in_flight = 0
+            if self.state == self.HALF_OPEN and self.probes_in_flight < self.half_open_probes:
+                self.probes_in_flight += 1
+                return True
+            METRICS.incr('upstream_short_circuited', host=self.host)
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probes_in_flight = 0
+            self._publish()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"{self.host} 회로 차단: {self.reset_timeout}초 후 재시도합니다.")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probes_in_flight = 0
+            self._publish()
+
+    # Gives back a half-open probe whose request never reached the host
+    def cancel_probe(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.probes_in_flight > 0:
+                self.probes_in_flight -= 1
+
+    # Seconds until the next trial probe may be sent
+    def retry_after(self):
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+# Recent response latencies of one host, used to derive its timeouts and hedging delay
+class LatencyTracker:
+    def __init__(self, host, window=LATENCY_WINDOW):
+        self.host = host
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    # Returns {quantile: seconds}, or None while there are too few samples
+    def percentiles(self, *quantiles):
+        with self._lock:
+            if len(self._samples) < MIN_LATENCY_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in quantiles}
+
+    # (connect, read) timeouts: a few times the typical and the tail latency, within fixed bounds
+    def timeouts(self):
+        observed = self.percentiles(0.5, 0.99)
+        if observed is None:
+            return DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+        connect = min(MAX_CONNECT_TIMEOUT, max(MIN_CONNECT_TIMEOUT, observed[0.5] * 3))
+        read = min(MAX_READ_TIMEOUT, max(MIN_READ_TIMEOUT, observed[0.99] * 4))
+        METRICS.set_gauge('upstream_read_timeout', round(read, 3), host=self.host)
+        return connect, read
+
+
+# Token bucket of retries for one host: every request deposits a fraction of a token, every retry spends one
+class RetryBudget:
+    def __init__(self, host, ratio=RETRY_BUDGET_RATIO, reserve=RETRY_BUDGET_RESERVE):
+        self.host = host
+        self.ratio = ratio
+        # The reserve allows a few retries before any traffic has been seen, and caps what can be saved up
+        self.max_tokens = reserve
+        self.tokens = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self, count_exhausted=True):
+        with self._lock:
+            if self.tokens < 1.0:
+                if count_exhausted:
+                    METRICS.incr('retry_budget_exhausted', host=self.host)
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+# Function to get the delay before the given retry attempt (1-based): full jitter under a capped exponential
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    return random.uniform(0.0, min(cap, base * 2 ** (attempt - 1)))
+
+
+_limiters = {}
+_breakers = {}
+_trackers = {}
+_retry_budgets = {}
+_limiters_lock = threading.Lock()
+
+
+# Coalesces concurrent calls for the same key into one execution whose result every caller shares
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+        if not leader:
+            METRICS.incr('singleflight_coalesced')
+            call['done'].wait()
+        else:
+            try:
+                call['result'] = fn()
+            except BaseException as e:
+                call['error'] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['done'].set()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+
+# Function to get the limiter for a host
+def get_limiter(host):
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter(host)
+        return _limiters[host]
+
+
+# Function to get the circuit breaker for a host
+def get_breaker(host):
+    with _limiters_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+# Function to get the latency tracker for a host
+def get_latency_tracker(host):
+    with _limiters_lock:
+        if host not in _trackers:
+            _trackers[host] = LatencyTracker(host)
+        return _trackers[host]
+
+
+# Function to get the retry budget for a host
+def get_retry_budget(host):
+    with _limiters_lock:
+        if host not in _retry_budgets:
+            _retry_budgets[host] = RetryBudget(host)
+        return _retry_budgets[host]
+
+
+# Function to list the current concurrency limit of every host seen so far
+def concurrency_limits():
+    with _limiters_lock:
+        return {host: int(limiter.limit) for host, limiter in _limiters.items()}
+
+
+# Function to build the pooled session shared by all fetch functions
+def build_session(http2=HTTP2_TRANSPORT, verify=True):
+    session = requests.Session()
+    session.verify = verify
+    # Headers carry their own cookies; do not let responses add more
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=MAX_CONCURRENCY)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if http2 and not http2_available():
+        print("httpx[http2] 0.27.1 이상이 설치되어 있지 않아 HTTP/1.1로 요청합니다. (pip install 'httpx[http2]>=0.27.1')")
+    elif http2:
+        # HTTP/2 is negotiated during the TLS handshake, so only HTTPS requests go through it. The pool is shared
+        # by all hosts and sized for the worst case, where every host falls back to HTTP/1.1
+        session.mount('https://', HTTP2Adapter(max_connections=POOL_HOSTS * MAX_CONCURRENCY, verify=verify))
+    return session
+
+
+SESSION = build_session()
+
+
+# Hedged requests run here so the caller can wait on whichever attempt answers first
+_hedge_pool = ThreadPoolExecutor(max_workers=4 * MAX_CONCURRENCY, thread_name_prefix='hedge')
+
+
+# Function to run callback once the request is over: now, or for a streamed response (stream=True) when the
+# caller closes it, since its body is still arriving. Callers that stream must close the response
+def _when_done(response, kwargs, callback):
+    if not kwargs.get('stream'):
+        callback()
+        return
+    close = response.close
+    done = []
+
+    def close_and_finish():
+        try:
+            close()
+        finally:
+            if not done:
+                done.append(True)
+                callback()
+
+    response.close = close_and_finish
+
+
+# Function to send one attempt on an already acquired limiter slot and record its outcome; the slot and the
+# latency sample cover a streamed body too, so AIMD and the adaptive timeouts see the time spent reading it
+def _send(url, headers, host, kwargs):
+    limiter, breaker = get_limiter(host), get_breaker(host)
+    start = time.monotonic()
+    try:
+        response = SESSION.get(url, headers=headers, **kwargs)
+    except PoolTimeout:
+        # Waited on this process's own connection pool; the upstream never saw the request
+        limiter.cancel()
+        breaker.cancel_probe()
+        METRICS.incr('upstream_pool_timeouts', host=host)
+        raise
+    except requests.RequestException:
+        limiter.release(None, time.monotonic() - start)
+        breaker.record_failure()
+        METRICS.incr('upstream_errors', host=host)
+        raise
+    except BaseException:
+        # e.g. a header that cannot be encoded; not the upstream's fault, but the slot must not leak
+        limiter.cancel()
+        breaker.cancel_probe()
+        raise
+    status_code = response.status_code
+    healthy = status_code < 500 and status_code not in THROTTLE_STATUS_CODES
+    if healthy:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+    METRICS.incr('upstream_responses', host=host, status=status_code)
+
+    def finish():
+        latency = time.monotonic() - start
+        limiter.release(status_code, latency)
+        if healthy:
+            get_latency_tracker(host).observe(latency)
+
+    _when_done(response, kwargs, finish)
+    return response
+
+
+# Function to close the response of an attempt that lost a hedge race
+def _close_loser(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+# Function to take a limiter slot for a hedged duplicate, or return False if none can be spared
+def _acquire_hedge_slot(host):
+    limiter = get_limiter(host)
+    if limiter.try_acquire():
+        return True
+    if not limiter.try_acquire(reserve=True):
+        return False
+    if not get_retry_budget(host).withdraw(count_exhausted=False):
+        limiter.cancel()
+        return False
+    METRICS.incr('upstream_hedged_reserved', host=host)
+    return True
+
+
+# Function to race the first attempt against one duplicate started after hedge_after seconds
+def _send_hedged(url, headers, host, kwargs, hedge_after):
+    primary = _hedge_pool.submit(_send, url, headers, host, kwargs)
+    done, _ = wait([primary], timeout=hedge_after)
+    # The duplicate never queues behind other requests: it takes a spare slot, or else one of the few slots kept
+    # past the limit for hedges, paid from the retry budget so duplicates stay a small share of the traffic
+    if done or not _acquire_hedge_slot(host):
+        return primary.result()
+
+    METRICS.incr('upstream_hedged', host=host)
+    METRICS.set_gauge('upstream_hedge_rate', round(METRICS.counter('upstream_hedged', host=host) / METRICS.counter('upstream_requests', host=host), 4), host=host)
+    hedge = _hedge_pool.submit(_send, url, headers, host, kwargs)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            if future is hedge:
+                METRICS.incr('upstream_hedge_wins', host=host)
+            for other in (primary, hedge):
+                if other is not future:
+                    other.add_done_callback(_close_loser)
+            return future.result()
+    raise error
+
+
+# Function to send a GET request through the host's circuit breaker and adaptive limiter,
+# with timeouts adapted to the host's observed latency and optional hedging of slow requests
+def http_get(url, headers=None, **kwargs):
+    host = urlsplit(url).netloc
+    breaker = get_breaker(host)
+    if not breaker.allow():
+        raise CircuitOpenError(host)
+
+    tracker = get_latency_tracker(host)
+    kwargs.setdefault('timeout', tracker.timeouts())
+    limiter = get_limiter(host)
+    priority, job_id = _request_priority.get()
+    limiter.acquire(priority, job_id)
+    METRICS.incr('upstream_requests', host=host)
+    get_retry_budget(host).deposit()
+
+    if priority == PRIORITY_BACKGROUND:
+        # Background work is never hedged, and holds its share of the limit until the request is over
+        try:
+            response = _send(url, headers, host, kwargs)
+        except BaseException:
+            limiter.background_done()
+            raise
+        _when_done(response, kwargs, limiter.background_done)
+        return response
+
+    # No duplicates while the breaker is probing a host that just failed
+    observed = tracker.percentiles(HEDGE_PERCENTILE) if HEDGE_REQUESTS and breaker.state == breaker.CLOSED else None
+    if observed is None:
+        return _send(url, headers, host, kwargs)
+    return _send_hedged(url, headers, host, kwargs, observed[HEDGE_PERCENTILE])